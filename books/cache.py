@@ -0,0 +1,133 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "books:catalog:version"
+CATALOG_MODIFIED_KEY = "books:catalog:modified"
+
+
+def get_catalog_version():
+    """Return the current ``(version, last modified timestamp)`` of the catalog.
+
+    A cold cache starts from a nanosecond timestamp rather than 1, so a
+    version evicted from the cache is never handed out again.
+    """
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+    version = values.get(CATALOG_VERSION_KEY)
+    modified = values.get(CATALOG_MODIFIED_KEY)
+
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    if modified is None:
+        modified = time.time()
+        cache.add(CATALOG_MODIFIED_KEY, modified, None)
+    return version, modified
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response.
+
+    The bump runs now and once more after the surrounding transaction
+    commits, so a reader can't cache rows the transaction is still changing
+    under the new version.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), None)
+
+
+def response_cache_key(version, request):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    location = f"{request.build_absolute_uri(request.path)}?{params}"
+    digest = hashlib.md5(f"{version}:{location}".encode()).hexdigest()
+    return f"books:catalog:response:{digest}", f'"{digest}"'
+
+
+def is_not_modified(request, etag, modified=None):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or etag in etags or f"W/{etag}" in etags
+
+    if modified is None:
+        return False
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since"))
+    return if_modified_since is not None and int(modified) <= if_modified_since
+
+
+class CachedCatalogMixin:
+    """Serve list and retrieve from a cache keyed by the catalog version.
+
+    Responses carry ``ETag`` and ``Last-Modified`` headers so clients can
+    revalidate with ``If-None-Match``/``If-Modified-Since`` and get a 304.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(request, super().alist, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(request, super().aretrieve, *args, **kwargs)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        version, modified = get_catalog_version()
+        key, etag = response_cache_key(version, request)
+        headers = {"ETag": etag, "Last-Modified": http_date(modified)}
+
+        if is_not_modified(request, etag, modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = cache.get(key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    async def acached_response(self, request, view, *args, **kwargs):
+        version, modified = await sync_to_async(get_catalog_version)()
+        key, etag = response_cache_key(version, request)
+        headers = {"ETag": etag, "Last-Modified": http_date(modified)}
+
+        if is_not_modified(request, etag, modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = await cache.aget(key)
+        if data is None:
+            response = await view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            await cache.aset(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+        for header, value in headers.items():
+            response[header] = value
+        return response
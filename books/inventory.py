@@ -0,0 +1,69 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+from books.models import Book
+
+# Callers publish an InventoryChanged event for the books they touch, whose
+# consumer invalidates the cached catalog once the change is committed.
+
+
+def reserve_copy(book_id):
+    """Take one copy of a book off the shelf.
+
+    The decrement is a single conditional ``UPDATE`` so concurrent borrowers
+    can never drive the inventory below zero. Returns ``False`` when the book
+    is out of stock.
+    """
+    return bool(
+        Book.objects.filter(pk=book_id, inventory__gt=0).update(
+            inventory=F("inventory") - 1
+        )
+    )
+
+
+def release_copy(book_id):
+    """Put one copy of a book back on the shelf."""
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + 1)
+
+
+def reserve_copies(book_ids):
+    """Take one copy off the shelf for every entry of ``book_ids``.
+
+    A book listed several times gets several copies. The rows are locked in
+    one query and updated with one conditional ``UPDATE`` per distinct copy
+    count. Must run inside a transaction. Returns ``{book_id: copies}`` for the
+    books that exist; books missing from the result do not exist.
+    """
+    wanted = Counter(book_ids)
+    available = dict(
+        Book.objects.select_for_update()
+        .filter(pk__in=wanted)
+        .order_by("pk")
+        .values_list("pk", "inventory")
+    )
+    reserved = {
+        book_id: min(count, available[book_id])
+        for book_id, count in wanted.items()
+        if book_id in available
+    }
+    _update_inventory(reserved, sign=-1)
+    return reserved
+
+
+def release_copies(book_ids):
+    """Put one copy back on the shelf for every entry of ``book_ids``."""
+    _update_inventory(Counter(book_ids), sign=1)
+
+
+def _update_inventory(copies, sign):
+    by_count = defaultdict(list)
+    for book_id, count in copies.items():
+        if count:
+            by_count[count].append(book_id)
+
+    for count, book_ids in by_count.items():
+        books = Book.objects.filter(pk__in=book_ids)
+        if sign < 0:
+            books = books.filter(inventory__gte=count)
+        books.update(inventory=F("inventory") + sign * count)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import IMPORT_FORMATS, detect_format, import_books, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create or update books by title from a CSV, JSON or NDJSON catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalog file to import.")
+        parser.add_argument(
+            "--format",
+            dest="import_format",
+            choices=sorted(set(IMPORT_FORMATS.values())),
+            help="File format, guessed from the extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            import_format = options["import_format"] or detect_format(options["path"])
+            with open(options["path"], encoding="utf-8-sig", newline="") as file:
+                result = import_books(
+                    read_rows(file, import_format), options["batch_size"]
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for error in result["errors"]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created {created} books, updated {updated}, "
+                "skipped {invalid} invalid rows.".format(**result)
+            )
+        )
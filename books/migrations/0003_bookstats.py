@@ -0,0 +1,71 @@
+# Generated by Django 5.1.5 on 2026-10-18 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+INSERT INTO books_bookstats (
+    book_id, active_loans, total_loans, returned_loans, late_returns,
+    loan_days, updated_at
+)
+SELECT
+    book.id,
+    count(borrowing.id) FILTER (WHERE borrowing.actual_return_date IS NULL),
+    count(borrowing.id),
+    count(borrowing.actual_return_date),
+    count(borrowing.id) FILTER (
+        WHERE borrowing.actual_return_date > borrowing.expected_return_date
+    ),
+    coalesce(sum(borrowing.actual_return_date - borrowing.borrow_date), 0),
+    now()
+FROM books_book book
+LEFT JOIN borrowings_borrowing borrowing ON borrowing.book_id = book.id
+GROUP BY book.id
+"""
+
+
+def backfill(apps, schema_editor):
+    # Only PostgreSQL databases can predate the table; SQLite ones are new.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(BACKFILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0002_book_search_vector_book_book_search_vector_idx"),
+        ("borrowings", "0005_borrowing_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookStats",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="books.book",
+                    ),
+                ),
+                ("active_loans", models.IntegerField(default=0)),
+                ("total_loans", models.IntegerField(default=0)),
+                ("returned_loans", models.IntegerField(default=0)),
+                ("late_returns", models.IntegerField(default=0)),
+                ("loan_days", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-total_loans", "book"],
+                        name="bookstats_total_loans_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
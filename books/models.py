@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
 
@@ -15,6 +17,57 @@ class Book(models.Model):
     )
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(decimal_places=2, max_digits=10)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="english")
+        + SearchVector("author", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [GinIndex(fields=["search_vector"], name="book_search_vector_idx")]
 
     def __str__(self):
         return self.title
+
+
+class BookStats(models.Model):
+    """Loan counters of a book, updated as copies are borrowed and returned.
+
+    Read by the staff stats endpoints instead of aggregating borrowings;
+    ``reconcile_book_stats`` recomputes them in full. Counters are plain
+    integers so a drifted value never makes a borrow or return fail.
+    """
+
+    book = models.OneToOneField(
+        Book, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    active_loans = models.IntegerField(default=0)
+    total_loans = models.IntegerField(default=0)
+    returned_loans = models.IntegerField(default=0)
+    late_returns = models.IntegerField(default=0)
+    loan_days = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-total_loans", "book"], name="bookstats_total_loans_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"Stats of {self.book}"
+
+    @property
+    def average_loan_days(self):
+        if not self.returned_loans:
+            return None
+        return round(self.loan_days / self.returned_loans, 1)
+
+    @property
+    def overdue_rate(self):
+        """Share of returned loans that came back after the expected date."""
+        if not self.returned_loans:
+            return None
+        return round(self.late_returns / self.returned_loans, 4)
@@ -0,0 +1,6 @@
+from library_service.pagination import KeysetPagination
+
+
+class BookPagination(KeysetPagination):
+    page_size = 15
+    ordering = ("id",)
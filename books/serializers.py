@@ -1,9 +1,31 @@
 from rest_framework import serializers
 
-from books.models import Book
+from books.models import Book, BookStats
+from library_service.fieldsets import SparseFieldsetMixin
+from library_service.timing import TimedSerializerMixin
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(
+    SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
+
+
+class BookStatsSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source="book.title", read_only=True)
+    average_loan_days = serializers.FloatField(read_only=True)
+    overdue_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookStats
+        fields = (
+            "book",
+            "title",
+            "active_loans",
+            "total_loans",
+            "average_loan_days",
+            "overdue_rate",
+            "updated_at",
+        )
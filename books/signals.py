@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from books.cache import bump_catalog_version
+from books.models import Book, BookStats
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Book)
+def create_book_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        BookStats.objects.create(book=instance)
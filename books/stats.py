@@ -0,0 +1,172 @@
+from collections import Counter
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Now
+
+from books.models import Book, BookStats
+from borrowings.models import OutboxEvent
+
+# Outbox consumer applying loan events to the counters.
+STATS_CONSUMER = "stats"
+RECONCILE_MAX_ATTEMPTS = 5
+SERIALIZATION_FAILURE = "40001"
+
+
+def record_borrows(book_ids):
+    """Count a new loan for every entry of ``book_ids``."""
+    loans = Counter(book_ids)
+    _add(loans, active_loans=loans, total_loans=loans)
+
+
+def record_returns(returns):
+    """Count returned loans.
+
+    ``returns`` holds ``(book_id, borrow_date, expected_return_date,
+    return_date)`` for each loan.
+    """
+    returned, late, days = Counter(), Counter(), Counter()
+    for book_id, borrow_date, expected_return_date, return_date in returns:
+        returned[book_id] += 1
+        late[book_id] += return_date > expected_return_date
+        days[book_id] += (return_date - borrow_date).days
+
+    _add(
+        returned,
+        active_loans={book_id: -count for book_id, count in returned.items()},
+        returned_loans=returned,
+        late_returns=late,
+        loan_days=days,
+    )
+
+
+def _add(book_ids, **deltas):
+    """Add per-book ``deltas`` to the stats counters in one ``UPDATE``.
+
+    Books imported in bulk get their stats row on their first loan.
+    """
+    if not book_ids:
+        return
+
+    missing = Book.objects.filter(pk__in=book_ids, stats__isnull=True)
+    BookStats.objects.bulk_create(
+        [BookStats(book_id=pk) for pk in missing.values_list("pk", flat=True)],
+        ignore_conflicts=True,
+    )
+    changes = {}
+    for field, per_book in deltas.items():
+        whens = [
+            When(book_id=book_id, then=Value(delta))
+            for book_id, delta in per_book.items()
+            if delta
+        ]
+        if whens:
+            changes[field] = F(field) + Case(*whens, default=Value(0))
+    BookStats.objects.filter(book_id__in=book_ids).update(updated_at=Now(), **changes)
+
+
+def recompute_book_stats(batch_size=1000):
+    """Recompute the stats of every book from its borrowings.
+
+    Books are handled in id order, one batch per transaction. Borrows and
+    returns reach the counters through the ``stats`` outbox consumer, so a
+    batch reads its counts and its books' pending ``stats`` events from one
+    ``REPEATABLE READ`` snapshot. It then marks those events processed,
+    since the counts already include them. A batch that collides with a
+    relay handling the same events is retried. Called inside a transaction,
+    batches run with that transaction's isolation and aren't retried.
+    Returns the number of books reconciled.
+    """
+    last_id, total = 0, 0
+    while True:
+        rows = _reconcile_batch_with_retries(last_id, batch_size)
+        if not rows:
+            return total
+        last_id = rows[-1]["pk"]
+        total += len(rows)
+
+
+def _reconcile_batch_with_retries(last_id, batch_size):
+    outermost = not connection.in_atomic_block
+    for attempt in range(1, RECONCILE_MAX_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                if outermost and connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+                        )
+                return _reconcile_batch(last_id, batch_size)
+        except OperationalError as e:
+            cause = e.__cause__
+            sqlstate = getattr(cause, "pgcode", None) or getattr(
+                cause, "sqlstate", None
+            )
+            if (
+                not outermost
+                or sqlstate != SERIALIZATION_FAILURE
+                or attempt == RECONCILE_MAX_ATTEMPTS
+            ):
+                raise
+
+
+def _reconcile_batch(last_id, batch_size):
+    returned = Q(borrowings__actual_return_date__isnull=False)
+    rows = list(
+        Book.objects.filter(pk__gt=last_id)
+        .order_by("pk")
+        .values("pk")
+        .annotate(
+            total_loans=Count("borrowings"),
+            active_loans=Count(
+                "borrowings",
+                filter=Q(borrowings__actual_return_date__isnull=True),
+            ),
+            returned_loans=Count("borrowings", filter=returned),
+            late_returns=Count(
+                "borrowings",
+                filter=Q(
+                    borrowings__actual_return_date__gt=F(
+                        "borrowings__expected_return_date"
+                    )
+                ),
+            ),
+            loan_duration=Sum(
+                F("borrowings__actual_return_date") - F("borrowings__borrow_date"),
+                filter=returned,
+            ),
+        )[:batch_size]
+    )
+    if not rows:
+        return rows
+
+    BookStats.objects.bulk_create(
+        [
+            BookStats(
+                book_id=row["pk"],
+                active_loans=row["active_loans"],
+                total_loans=row["total_loans"],
+                returned_loans=row["returned_loans"],
+                late_returns=row["late_returns"],
+                loan_days=row["loan_duration"].days if row["loan_duration"] else 0,
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=["book"],
+        update_fields=[
+            "active_loans",
+            "total_loans",
+            "returned_loans",
+            "late_returns",
+            "loan_days",
+            "updated_at",
+        ],
+    )
+    OutboxEvent.objects.filter(
+        consumer=STATS_CONSUMER,
+        status=OutboxEvent.StatusChoices.PENDING,
+        payload__book_id__gt=last_id,
+        payload__book_id__lte=rows[-1]["pk"],
+    ).update(status=OutboxEvent.StatusChoices.PROCESSED, processed_at=Now())
+    return rows
@@ -0,0 +1,13 @@
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from books.stats import recompute_book_stats
+
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def reconcile_book_stats():
+    total = recompute_book_stats()
+    logger.info(f"Reconciled stats of {total} books.")
+    return total
@@ -1,13 +1,44 @@
-from django.test import TestCase
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.urls import reverse
+from datetime import date, timedelta
+from decimal import Decimal
+import base64
+import csv
+import io
+import json
+import tempfile
+import uuid
 from rest_framework import status
-from rest_framework.test import APIClient
-
-from books.models import Book
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+from books.inventory import reserve_copy
+from books.models import Book, BookStats
+from books.search import rank_books
 from books.serializers import BookSerializer
+from books.stats import record_borrows
+from books.tasks import reconcile_book_stats
+from books.views import BookViewSet
+from borrowings.events import inventory_changed, publish, relay_pending_events
+from library_service.middleware import RequestTimingMiddleware
+from library_service.testing import query_budget
+from library_service.throttling import ScopedRateThrottle
+from library_service.timing import instrument_connection, record_current_query
 
 BOOK_URL = reverse("books:book-list")
+EXPORT_URL = reverse("books:book-export")
+IMPORT_URL = reverse("books:book-import-catalog")
 
 
 def detail_url(book_id):
@@ -44,6 +75,15 @@ class AuthenticatedBookApiTest(TestCase):
         )
         self.client.force_authenticate(self.user)
 
+    def test_list_books_fields(self):
+        book = sample_book(title="Book 1")
+
+        with query_budget(2) as queries:
+            response = self.client.get(BOOK_URL, {"fields": "id,title"})
+
+        self.assertEqual(response.data["results"], [{"id": book.id, "title": "Book 1"}])
+        self.assertNotIn('"daily_fee"', queries.captured_queries[-1]["sql"])
+
     def test_list_books(self):
         sample_book(title="Book 1")
         sample_book(title="Book 2")
@@ -183,3 +223,677 @@ class AdminBookApiTest(TestCase):
 
         response = self.client.post(BOOK_URL, payload)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(20):
+            sample_book(title=f"Book {i}", author=f"Author {i}")
+
+    def test_list_books_query_budget(self):
+        with query_budget(2):
+            response = self.client.get(BOOK_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_filter_books_query_budget(self):
+        with query_budget(2):
+            response = self.client.get(BOOK_URL, {"title": "book", "author": "1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_book_query_budget(self):
+        book = Book.objects.first()
+
+        with query_budget(1):
+            response = self.client.get(detail_url(book.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BookPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+        self.books = [sample_book(title=f"Book {i}") for i in range(40)]
+
+    def test_walk_pages_forward_and_back(self):
+        response = self.client.get(BOOK_URL)
+        first_page = response.data["results"]
+
+        self.assertEqual(response.data["count"], 40)
+        self.assertEqual(len(first_page), 15)
+        self.assertIsNone(response.data["previous"])
+
+        seen = [book["id"] for book in first_page]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen += [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(seen, [book.id for book in self.books])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]],
+            [book.id for book in self.books[15:30]],
+        )
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(response.data["results"], first_page)
+        self.assertIsNone(response.data["previous"])
+
+    def test_count_can_be_skipped(self):
+        with query_budget(1):
+            response = self.client.get(BOOK_URL, {"count": "false"})
+
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 15)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(BOOK_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_are_type_checked(self):
+        for values in (["abc"], [None], [[1]], [{"id": 1}]):
+            cursor = base64.urlsafe_b64encode(json.dumps({"v": values}).encode())
+
+            response = self.client.get(BOOK_URL, {"cursor": cursor.decode()})
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        cache.clear()
+        cursor = base64.urlsafe_b64encode(json.dumps({"v": ["x", 1]}).encode())
+        response = self.client.get(BOOK_URL, {"q": "Book", "cursor": cursor.decode()})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+        self.django_book = sample_book(
+            title="Django for Beginners", author="W. Vincent"
+        )
+        self.python_book = sample_book(title="Python Tricks", author="Dan Bader")
+        self.author_match = sample_book(title="Web Apps", author="Django Reinhardt")
+        self.two_scoops = sample_book(
+            title="Two Scoops of Django", author="Daniel Greenfeld"
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(BOOK_URL, {"q": query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["id"] for book in response.data["results"]]
+
+    def test_search_ranks_title_matches_first(self):
+        ids = self.search("django")
+
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids[-1], self.author_match.id)
+        self.assertNotIn(self.python_book.id, ids)
+
+    def test_fast_list_renders_same_bytes(self):
+        for _ in range(16):
+            sample_book(title=f"Django \u2028 {uuid.uuid4().hex[:6]}")
+
+        for params in ({"q": "django"}, {"q": "django", "fields": "id,daily_fee"}):
+            cache.clear()
+            with override_settings(FAST_LIST_VIEWS=False):
+                expected = self.client.get(BOOK_URL, params)
+            cache.clear()
+            response = self.client.get(BOOK_URL, params)
+
+            self.assertEqual(response.content, expected.content)
+            cursor = parse_qs(response.data["next"].split("?")[1])["cursor"][0]
+            with override_settings(FAST_LIST_VIEWS=False):
+                expected = self.client.get(BOOK_URL, {**params, "cursor": cursor})
+            response = self.client.get(BOOK_URL, {**params, "cursor": cursor})
+            self.assertEqual(response.content, expected.content)
+
+    def test_search_matches_word_prefixes_and_all_terms(self):
+        self.assertEqual(self.search("pyth"), [self.python_book.id])
+        self.assertEqual(self.search("django scoops"), [self.two_scoops.id])
+        self.assertEqual(self.search("dan"), [self.python_book.id, self.two_scoops.id])
+
+    def test_search_results_are_paginated_by_rank(self):
+        for i in range(20):
+            sample_book(title=f"Django Recipes {i}", author="Someone")
+
+        response = self.client.get(BOOK_URL, {"q": "django"})
+        ids = [book["id"] for book in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(len(ids), 23)
+        self.assertEqual(len(set(ids)), 23)
+        self.assertEqual(ids[-1], self.author_match.id)
+
+    def test_search_query_budget(self):
+        # The fallback reads the matching rows once more to rank them.
+        with query_budget(2 if connection.vendor == "postgresql" else 3):
+            self.search("django")
+
+    def test_blank_search(self):
+        self.assertEqual(self.search("!!"), [])
+
+    @patch("books.search.connection")
+    def test_fallback_ranker(self, mock_connection):
+        # Also covered for real by running the tests with SQLITE_PATH set.
+        mock_connection.vendor = "sqlite"
+
+        ids = self.search("django")
+
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids[-1], self.author_match.id)
+        self.assertEqual(self.search("django scoops"), [self.two_scoops.id])
+
+    def test_rank_books(self):
+        rows = [
+            (1, "Django for Beginners", "W. Vincent"),
+            (2, "Web Apps", "Django Reinhardt"),
+            (3, "Python Tricks", "Dan Bader"),
+        ]
+
+        ranks = rank_books(rows, ["django"])
+
+        self.assertEqual(set(ranks), {1, 2})
+        self.assertGreater(ranks[1], ranks[2])
+
+    @patch.dict(ScopedRateThrottle.THROTTLE_RATES, {"search": "1/min"})
+    def test_search_scope(self):
+        cache.clear()
+
+        first = self.client.get(BOOK_URL, {"q": "django"})
+        second = self.client.get(BOOK_URL, {"q": "python"})
+        listing = self.client.get(BOOK_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(listing.status_code, status.HTTP_200_OK)
+
+
+class BookCatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(title="Cached Book")
+
+    def test_list_is_served_from_cache(self):
+        self.client.get(BOOK_URL)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(BOOK_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["title"], "Cached Book")
+
+    def test_cache_is_keyed_by_query_params(self):
+        sample_book(title="Other Book", author="Someone Else")
+        self.client.get(BOOK_URL)
+
+        response = self.client.get(BOOK_URL, {"author": "someone"})
+
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_book_changes_invalidate_cache(self):
+        self.client.get(BOOK_URL)
+        self.client.get(detail_url(self.book.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Renamed Book"
+            self.book.save()
+
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response.data["results"][0]["title"], "Renamed Book")
+        response = self.client.get(detail_url(self.book.id))
+        self.assertEqual(response.data["title"], "Renamed Book")
+
+        self.book.delete()
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response.data["results"], [])
+
+    def test_inventory_changes_invalidate_cache(self):
+        self.client.get(detail_url(self.book.id))
+
+        reserve_copy(self.book.id)
+        publish(inventory_changed([self.book.id]))
+        relay_pending_events()
+
+        response = self.client.get(detail_url(self.book.id))
+        self.assertEqual(response.data["inventory"], 9)
+
+    def test_conditional_requests(self):
+        response = self.client.get(BOOK_URL)
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(BOOK_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            BOOK_URL, {"title": "cached"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        sample_book(title="New Book")
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_missing_book_is_not_cached(self):
+        response = self.client.get(detail_url(self.book.id + 1000))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("ETag", response)
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+        sample_book()
+
+    def test_server_timing_header(self):
+        response = self.client.get(BOOK_URL)
+
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn('desc="2 queries"', timing)
+        for metric in ("serializer;dur=", "view;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertNotIn("dup;", timing)
+
+    def test_logs_request_line(self):
+        with self.assertLogs("library_service.middleware", "INFO") as logs:
+            self.client.get(detail_url(Book.objects.get().id))
+
+        self.assertRegex(
+            logs.output[0],
+            r"method=GET path=/api/books/\d+/ status=200 queries=1 duplicates=0 "
+            r"db_ms=[\d.]+ serializer_ms=[\d.]+ view_ms=[\d.]+ total_ms=[\d.]+",
+        )
+
+    def test_flags_repeated_statements(self):
+        def n_plus_one(request):
+            for book_id in range(3):
+                list(Book.objects.filter(id=book_id))
+            return HttpResponse()
+
+        middleware = RequestTimingMiddleware(n_plus_one)
+        with self.assertLogs("library_service.middleware", "WARNING") as logs:
+            response = middleware(RequestFactory().get("/"))
+
+        self.assertIn('dup;desc="1 repeated statements"', response["Server-Timing"])
+        self.assertIn("Possible N+1: statement ran 3 times", logs.output[0])
+
+    async def test_async_requests_count_queries(self):
+        async def get_response(request):
+            await Book.objects.acount()
+            return HttpResponse()
+
+        def uninstrument():
+            connection_created.disconnect(dispatch_uid="request_timing")
+            connection.execute_wrappers.remove(record_current_query)
+
+        # The test connection already exists, so connection_created won't fire.
+        await sync_to_async(instrument_connection)(sender=None, connection=connection)
+        try:
+            middleware = RequestTimingMiddleware(get_response)
+            response = await middleware(RequestFactory().get("/"))
+        finally:
+            await sync_to_async(uninstrument)()
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_off_switch_removes_middleware(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestTimingMiddleware(lambda request: HttpResponse())
+
+
+class AsyncBookViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@test.com", password="testpassword123"
+        )
+        self.books = [sample_book(title=f"Book {i}") for i in range(20)]
+
+    def view(self, actions):
+        with override_settings(ASYNC_VIEWS=True):
+            return BookViewSet.as_view(actions)
+
+    def get(self, view, path, user=None, **kwargs):
+        request = self.factory.get(path)
+        if user:
+            force_authenticate(request, user)
+        return view(request, **kwargs)
+
+    async def test_list(self):
+        view = self.view({"get": "list", "post": "create"})
+
+        response = await self.get(view, BOOK_URL, self.user)
+
+        self.assertTrue(iscoroutinefunction(view))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 20)
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]],
+            [book.id for book in self.books[:15]],
+        )
+        self.assertIsNotNone(response.data["next"])
+
+    async def test_retrieve(self):
+        view = self.view({"get": "retrieve"})
+        book = self.books[0]
+
+        response = await self.get(view, detail_url(book.id), self.user, pk=book.id)
+        missing = await self.get(view, detail_url(0), self.user, pk=0)
+
+        self.assertEqual(response.data["title"], book.title)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sync_view_when_switched_off(self):
+        view = BookViewSet.as_view({"get": "list"})
+
+        self.assertFalse(iscoroutinefunction(view))
+
+
+class BookStatsApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com", password="adminpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.book = sample_book(title="Popular")
+        self.other_book = sample_book(title="Niche")
+
+    def borrow(self, book, days_ago, loan_days=7, returned_after=None):
+        borrowing = book.borrowings.create(
+            user=self.admin,
+            expected_return_date=date.today() - timedelta(days_ago - loan_days),
+        )
+        borrow_date = date.today() - timedelta(days_ago)
+        actual_return_date = (
+            borrow_date + timedelta(returned_after)
+            if returned_after is not None
+            else None
+        )
+        book.borrowings.filter(pk=borrowing.pk).update(
+            borrow_date=borrow_date, actual_return_date=actual_return_date
+        )
+
+    def test_stats_row_created_with_book(self):
+        stats = BookStats.objects.get(book=self.book)
+
+        self.assertEqual(stats.total_loans, 0)
+        self.assertIsNone(stats.average_loan_days)
+
+    def test_reconcile_and_stats(self):
+        self.borrow(self.book, days_ago=30, returned_after=4)
+        self.borrow(self.book, days_ago=20, returned_after=10)
+        self.borrow(self.book, days_ago=2)
+        self.borrow(self.other_book, days_ago=1)
+
+        self.assertEqual(reconcile_book_stats(), 2)
+        response = self.client.get(reverse("books:book-stats", args=[self.book.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Popular")
+        self.assertEqual(response.data["active_loans"], 1)
+        self.assertEqual(response.data["total_loans"], 3)
+        self.assertEqual(response.data["average_loan_days"], 7.0)
+        self.assertEqual(response.data["overdue_rate"], 0.5)
+
+    def test_most_borrowed(self):
+        self.borrow(self.other_book, days_ago=3)
+        self.borrow(self.book, days_ago=2)
+        self.borrow(self.book, days_ago=1)
+        reconcile_book_stats()
+        url = reverse("books:book-most-borrowed")
+
+        with query_budget(1):
+            response = self.client.get(url, {"limit": 1})
+
+        self.assertEqual(
+            [(row["book"], row["total_loans"]) for row in response.data],
+            [(self.book.id, 2)],
+        )
+        response = self.client.get(url, {"limit": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("limit", response.data)
+
+    def test_stats_for_staff_only(self):
+        reader = get_user_model().objects.create_user(
+            email="reader@test.com", password="testpass"
+        )
+        self.client.force_authenticate(reader)
+
+        response = self.client.get(reverse("books:book-stats", args=[self.book.id]))
+        top_response = self.client.get(reverse("books:book-most-borrowed"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(top_response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats_of_missing_book(self):
+        response = self.client.get(reverse("books:book-stats", args=[0]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com", password="adminpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.books = [
+            sample_book(title=f"Book {number}", author=author)
+            for number, author in enumerate(("Ann", "Bob", "Ann"))
+        ]
+
+    def test_export_catalog(self):
+        response = self.client.get(EXPORT_URL, {"author": "ann"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(io.StringIO(response.getvalue().decode())))
+        self.assertEqual(
+            rows[0], ["id", "title", "author", "cover", "inventory", "daily_fee"]
+        )
+        self.assertEqual(
+            rows[1:],
+            [
+                [str(book.id), book.title, "Ann", "SOFT", "10", "5.99"]
+                for book in (self.books[0], self.books[2])
+            ],
+        )
+
+    def test_export_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@test.com", password="testpass"
+            )
+        )
+
+        response = self.client.get(EXPORT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BookImportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com", password="adminpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.existing = sample_book(title="Existing")
+
+    def books(self):
+        return list(
+            Book.objects.order_by("title").values_list(
+                "title", "author", "cover", "inventory", "daily_fee"
+            )
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Imports with COPY.")
+    def test_import_json(self):
+        payload = [
+            {"title": "New", "author": "Ann", "inventory": 3, "daily_fee": 1.5},
+            {
+                "title": "Existing",
+                "author": "Bob",
+                "cover": "hard",
+                "inventory": "2",
+                "daily_fee": "0.99",
+            },
+            {"title": "", "author": "Ann", "inventory": 1, "daily_fee": 1},
+            {
+                "title": "Bad",
+                "author": "Ann",
+                "cover": "PAPER",
+                "inventory": -1,
+                "daily_fee": "1.999",
+            },
+        ]
+
+        response = self.client.post(IMPORT_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["updated"]), (1, 1))
+        self.assertEqual(response.data["invalid"], 2)
+        self.assertEqual(
+            response.data["errors"],
+            [
+                {"row": 3, "errors": {"title": ["This field is required."]}},
+                {
+                    "row": 4,
+                    "errors": {
+                        "cover": ['"PAPER" is not a valid choice.'],
+                        "inventory": ["Ensure this value is between 0 and 2147483647."],
+                        "daily_fee": [
+                            "Ensure that there are no more than 2 decimal places."
+                        ],
+                    },
+                },
+            ],
+        )
+        self.assertEqual(
+            self.books(),
+            [
+                ("Existing", "Bob", "HARD", 2, Decimal("0.99")),
+                ("New", "Ann", "SOFT", 3, Decimal("1.50")),
+            ],
+        )
+        new = Book.objects.get(title="New")
+        self.assertFalse(BookStats.objects.filter(book=new).exists())
+        record_borrows([new.pk])
+        self.assertEqual(BookStats.objects.get(book=new).total_loans, 1)
+
+    @skipUnless(connection.vendor == "postgresql", "Imports with COPY.")
+    def test_import_csv_file_in_batches(self):
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "One,Ann,SOFT,1,1.00\n"
+            "Two,Ann,HARD,2,2.00\n"
+            "One,Bob,SOFT,5,1.25\n"
+            "Three,Ann,SOFT,x,3.00\n"
+        )
+        upload = SimpleUploadedFile("books.csv", content.encode(), "text/csv")
+
+        with override_settings(IMPORT_BATCH_SIZE=2):
+            response = self.client.post(IMPORT_URL, {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["updated"]), (2, 1))
+        self.assertEqual(
+            response.data["errors"],
+            [{"row": 4, "errors": {"inventory": ["A valid integer is required."]}}],
+        )
+        self.assertIn(("One", "Bob", "SOFT", 5, Decimal("1.25")), self.books())
+
+    @skipUnless(connection.vendor == "postgresql", "Imports with COPY.")
+    def test_import_ndjson_file_with_invalid_line(self):
+        lines = [
+            json.dumps(
+                {"title": "One", "author": "Ann", "inventory": 1, "daily_fee": 1}
+            ),
+            "{not json",
+        ]
+        upload = SimpleUploadedFile("books.ndjson", "\n".join(lines).encode())
+
+        response = self.client.post(IMPORT_URL, {"file": upload})
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            response.data["errors"][0]["errors"],
+            {"non_field_errors": ["Expected an object with the book fields."]},
+        )
+
+    def test_import_unsupported_file(self):
+        upload = SimpleUploadedFile("books.xml", b"<books/>")
+
+        response = self.client.post(IMPORT_URL, {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMPORT_MAX_ERRORS=2)
+    def test_reported_errors_are_capped(self):
+        response = self.client.post(IMPORT_URL, [{"title": "x"}] * 5, format="json")
+
+        self.assertEqual(response.data["invalid"], 5)
+        self.assertEqual(len(response.data["errors"]), 2)
+
+    def test_import_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@test.com", password="testpass"
+            )
+        )
+
+        response = self.client.post(IMPORT_URL, [], format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @skipUnless(connection.vendor == "postgresql", "Imports with COPY.")
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump(
+                [{"title": "One", "author": "Ann", "inventory": 1, "daily_fee": 1}],
+                file,
+            )
+            file.flush()
+            out = io.StringIO()
+
+            call_command("import_books", file.name, stdout=out)
+
+        self.assertIn("Created 1 books, updated 0", out.getvalue())
+        self.assertEqual(Book.objects.get(title="One").author, "Ann")
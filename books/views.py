@@ -1,22 +1,65 @@
-from rest_framework import viewsets
-from rest_framework.pagination import PageNumberPagination
+import io
 
-from books.models import Book
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.fields import empty
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from books.cache import CachedCatalogMixin
+from books.importer import detect_format, import_books, read_rows
+from books.models import Book, BookStats
+from books.pagination import BookPagination
+from books.search import search_books
 from books.permissions import IsAdminOrIfAuthenticatedReadOnly
-from books.serializers import BookSerializer
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from books.serializers import BookSerializer, BookStatsSerializer
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
+from library_service.async_views import AsyncReadMixin
+from library_service.export import EXPORT_PARAMETERS, export_response
+from library_service.fastpath import FastListMixin
+from library_service.fieldsets import FIELDSET_PARAMETERS, SparseFieldsetViewMixin
+
+MOST_BORROWED_MAX_LIMIT = 100
+EXPORT_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "author": "author",
+    "cover": "cover",
+    "inventory": "inventory",
+    "daily_fee": "daily_fee",
+}
 
 
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.all()
+@extend_schema_view(retrieve=extend_schema(parameters=FIELDSET_PARAMETERS))
+class BookViewSet(
+    CachedCatalogMixin,
+    SparseFieldsetViewMixin,
+    FastListMixin,
+    AsyncReadMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Book.objects.defer("search_vector")
     serializer_class = BookSerializer
     permission_classes = [IsAdminOrIfAuthenticatedReadOnly]
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 15
+    pagination_class = BookPagination
+
+    @property
+    def throttle_scope(self):
+        # Ranked search costs far more than a catalog page.
+        if self.action == "list" and self.request.query_params.get("q"):
+            return "search"
+        return None
 
     @extend_schema(
         parameters=[
+            OpenApiParameter(
+                name="q",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Search books by title and author, best matches first",
+            ),
             OpenApiParameter(
                 name="title",
                 type=OpenApiTypes.STR,
@@ -29,20 +72,127 @@ class BookViewSet(viewsets.ModelViewSet):
                 location=OpenApiParameter.QUERY,
                 description="Filter books by author",
             ),
+            *FIELDSET_PARAMETERS,
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @property
+    def keyset_ordering(self):
+        if self.request.query_params.get("q"):
+            return ("-rank", "id")
+        return None
+
     def get_queryset(self):
         queryset = self.queryset
+        query = self.request.query_params.get("q")
         title = self.request.query_params.get("title")
         author = self.request.query_params.get("author")
 
+        if query:
+            queryset = search_books(queryset, query)
+
         if title:
             queryset = queryset.filter(title__icontains=title)
 
         if author:
             queryset = queryset.filter(author__icontains=author)
 
-        return queryset.distinct()
+        return queryset
+
+    @extend_schema(
+        description="Loan statistics of a book (staff only).",
+        responses=BookStatsSerializer,
+    )
+    @action(detail=True, methods=["get"], permission_classes=[IsAdminUser])
+    def stats(self, request, pk=None):
+        book = self.get_object()
+        stats = BookStats.objects.filter(book=book).first() or BookStats()
+        stats.book = book
+        return Response(BookStatsSerializer(stats).data)
+
+    @extend_schema(
+        description="Books with the most loans, most borrowed first (staff only).",
+        parameters=[
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=(
+                    "Number of books, 10 by default, "
+                    f"{MOST_BORROWED_MAX_LIMIT} at most"
+                ),
+            ),
+        ],
+        responses=BookStatsSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="most-borrowed",
+        permission_classes=[IsAdminUser],
+    )
+    def most_borrowed(self, request):
+        try:
+            limit = serializers.IntegerField(
+                min_value=1, max_value=MOST_BORROWED_MAX_LIMIT, default=10
+            ).run_validation(request.query_params.get("limit", empty))
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({"limit": e.detail})
+        stats = (
+            BookStats.objects.select_related("book")
+            .defer("book__search_vector")
+            .order_by("-total_loans", "book")[:limit]
+        )
+        return Response(BookStatsSerializer(stats, many=True).data)
+
+    @extend_schema(
+        description=(
+            "Stream the whole catalog as CSV or NDJSON (staff only). "
+            "Accepts the title and author filters."
+        ),
+        parameters=EXPORT_PARAMETERS,
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        return export_response(
+            request, self.get_queryset().order_by("id"), EXPORT_COLUMNS, "books"
+        )
+
+    @extend_schema(
+        description=(
+            "Create or update books by title (staff only). Send a JSON array "
+            "of books, or a CSV, JSON or NDJSON file in the multipart `file` "
+            "field. Invalid rows are skipped and reported."
+        ),
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            },
+            "application/json": BookSerializer(many=True),
+        },
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[JSONParser, MultiPartParser],
+    )
+    def import_catalog(self, request):
+        upload = request.FILES.get("file")
+        try:
+            if upload is not None:
+                file = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+                rows = read_rows(file, detect_format(upload.name))
+                result = import_books(rows)
+            elif isinstance(request.data, list):
+                result = import_books(request.data)
+            else:
+                raise ValueError("Send a JSON array of books or a file.")
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return Response(result)
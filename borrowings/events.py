@@ -0,0 +1,174 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from books.cache import bump_catalog_version
+from books.stats import STATS_CONSUMER, record_borrows, record_returns
+from .models import OutboxEvent
+from .notifications import (
+    borrowing_created_message,
+    enqueue_notifications,
+    retry_delay,
+)
+
+logger = logging.getLogger(__name__)
+
+EventType = OutboxEvent.EventTypeChoices
+
+
+def notify_borrowings_created(payloads):
+    enqueue_notifications(
+        borrowing_created_message(
+            payload["book_title"],
+            payload["user_email"],
+            payload["expected_return_date"],
+        )
+        for payload in payloads
+    )
+
+
+def count_borrows(payloads):
+    record_borrows(payload["book_id"] for payload in payloads)
+
+
+def count_returns(payloads):
+    record_returns(
+        (
+            payload["book_id"],
+            date.fromisoformat(payload["borrow_date"]),
+            date.fromisoformat(payload["expected_return_date"]),
+            date.fromisoformat(payload["return_date"]),
+        )
+        for payload in payloads
+    )
+
+
+def invalidate_catalog(payloads):
+    bump_catalog_version()
+
+
+# Event type -> {consumer name: handler taking a batch of payloads}. Every
+# consumer gets its own outbox row, so one failing doesn't replay the others.
+CONSUMERS = {
+    EventType.BORROWING_CREATED: {
+        "notifications": notify_borrowings_created,
+        STATS_CONSUMER: count_borrows,
+    },
+    EventType.BOOK_RETURNED: {STATS_CONSUMER: count_returns},
+    EventType.INVENTORY_CHANGED: {"cache": invalidate_catalog},
+}
+
+
+def publish(events):
+    """Write ``(event_type, payload)`` events to the outbox in one query.
+
+    Must run in the transaction making the change, so events are stored if
+    and only if it commits; they are relayed after the commit.
+    """
+    rows = [
+        OutboxEvent(event_type=event_type, consumer=consumer, payload=payload)
+        for event_type, payload in events
+        for consumer in CONSUMERS[event_type]
+    ]
+    if rows:
+        OutboxEvent.objects.bulk_create(rows)
+        transaction.on_commit(schedule_relay)
+
+
+def borrowing_created(borrowing, book_title, email):
+    return (
+        EventType.BORROWING_CREATED,
+        {
+            "borrowing_id": borrowing.pk,
+            "book_id": borrowing.book_id,
+            "book_title": book_title,
+            "user_id": borrowing.user_id,
+            "user_email": email,
+            "expected_return_date": borrowing.expected_return_date,
+        },
+    )
+
+
+def book_returned(
+    borrowing_id, book_id, borrow_date, expected_return_date, return_date
+):
+    return (
+        EventType.BOOK_RETURNED,
+        {
+            "borrowing_id": borrowing_id,
+            "book_id": book_id,
+            "borrow_date": borrow_date,
+            "expected_return_date": expected_return_date,
+            "return_date": return_date,
+        },
+    )
+
+
+def inventory_changed(book_ids):
+    return [(EventType.INVENTORY_CHANGED, {"book_id": book_id}) for book_id in book_ids]
+
+
+def schedule_relay(countdown=None):
+    from .tasks import relay_events
+
+    try:
+        relay_events.apply_async(countdown=countdown)
+    except Exception as e:
+        # The events stay in the outbox, beat's sweep will pick them up.
+        logger.warning(f"Failed to schedule event relay: {e}")
+
+
+def relay_pending_events(batch_size=None):
+    """Hand a batch of due events to their consumers.
+
+    Events are locked with ``SKIP LOCKED`` so concurrent relays never take
+    the same rows, grouped per consumer and handled in one call each. A
+    consumer's database writes commit together with its events being
+    marked processed; a failing consumer is retried with backoff, up to
+    ``EVENT_MAX_ATTEMPTS`` times. Returns whether a full batch was relayed
+    and the seconds after which a retry is due, or ``None``.
+    """
+    batch_size = batch_size or settings.EVENT_RELAY_BATCH_SIZE
+    now = timezone.now()
+    retry_in = None
+
+    with transaction.atomic():
+        pending = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEvent.StatusChoices.PENDING, next_attempt_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        batches = defaultdict(list)
+        for event in pending:
+            batches[event.event_type, event.consumer].append(event)
+
+        for (event_type, consumer), events in batches.items():
+            try:
+                with transaction.atomic():
+                    CONSUMERS[event_type][consumer]([event.payload for event in events])
+            except Exception as e:
+                logger.exception(f"{consumer} failed to handle {event_type} events.")
+                for event in events:
+                    event.attempts += 1
+                    event.last_error = str(e)
+                    if event.attempts >= settings.EVENT_MAX_ATTEMPTS:
+                        event.status = OutboxEvent.StatusChoices.FAILED
+                    else:
+                        delay = retry_delay(event.attempts)
+                        event.next_attempt_at = now + timedelta(seconds=delay)
+                        retry_in = delay if retry_in is None else min(retry_in, delay)
+            else:
+                for event in events:
+                    event.status = OutboxEvent.StatusChoices.PROCESSED
+                    event.processed_at = now
+
+        OutboxEvent.objects.bulk_update(
+            pending,
+            ["status", "attempts", "next_attempt_at", "last_error", "processed_at"],
+        )
+
+    return len(pending) >= batch_size, retry_in
@@ -0,0 +1,114 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DateField,
+    DecimalField,
+    F,
+    Func,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Round
+
+CENT = Decimal("0.01")
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def calculate_fees(borrow_date, expected_return_date, return_date, daily_fee):
+    """Borrowing fee and overdue fine of a loan returned on ``return_date``.
+
+    Every day the book is kept costs its ``daily_fee``, with a minimum of
+    one day; every day past the expected return date adds a fine of
+    ``daily_fee * BORROWING_FINE_MULTIPLIER``.
+    """
+    days = max((return_date - borrow_date).days, 1)
+    overdue_days = max((return_date - expected_return_date).days, 0)
+    fee = days * daily_fee
+    fine = overdue_days * daily_fee * Decimal(settings.BORROWING_FINE_MULTIPLIER)
+    return (
+        fee.quantize(CENT, rounding=ROUND_HALF_UP),
+        fine.quantize(CENT, rounding=ROUND_HALF_UP),
+    )
+
+
+class DaysBetween(Func):
+    """Whole days from ``start`` to ``end``."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS integer)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def fee_expressions(end):
+    """:func:`calculate_fees` as database expressions for loans ending on ``end``."""
+    daily_fee = F("book__daily_fee")
+    days = Greatest(DaysBetween(end, F("borrow_date")), Value(1))
+    overdue_days = Greatest(DaysBetween(end, F("expected_return_date")), Value(0))
+    multiplier = Value(Decimal(settings.BORROWING_FINE_MULTIPLIER), output_field=MONEY)
+    return (
+        Round(days * daily_fee, 2, output_field=MONEY),
+        Round(overdue_days * daily_fee * multiplier, 2, output_field=MONEY),
+    )
+
+
+def annotate_fees(queryset, today):
+    """Annotate borrowings with ``accrued_fee`` and ``accrued_fine``.
+
+    Returned loans are charged up to their return date, open ones up to
+    ``today``. Computed by the database, so totals over any number of loans
+    take a single query.
+    """
+    end = Coalesce(F("actual_return_date"), Value(today, output_field=DateField()))
+    accrued_fee, accrued_fine = fee_expressions(end)
+    return queryset.annotate(accrued_fee=accrued_fee, accrued_fine=accrued_fine)
+
+
+def billing_report(day, today):
+    """Fees billed for loans returned on ``day`` and accrued by open loans.
+
+    Takes two aggregate queries however many borrowings there are.
+    """
+    from .models import Borrowing
+
+    zero = Value(Decimal("0.00"), output_field=MONEY)
+    returned = Borrowing.objects.filter(actual_return_date=day).aggregate(
+        returned=Count("id"),
+        fees=Coalesce(Sum("fee"), zero),
+        fines=Coalesce(Sum("fine"), zero),
+    )
+    open_loans = annotate_fees(
+        Borrowing.objects.filter(actual_return_date__isnull=True), today
+    ).aggregate(
+        open=Count("id"),
+        overdue=Count("id", filter=Q(expected_return_date__lt=today)),
+        accrued_fees=Coalesce(Sum("accrued_fee"), zero),
+        accrued_fines=Coalesce(Sum("accrued_fine"), zero),
+    )
+    return {"day": day, "today": today, **returned, **open_loans}
+
+
+def render_billing_report(report):
+    return (
+        f"Billing report for {report['day']}.\n"
+        f"Returned: {report['returned']} borrowings, "
+        f"fees {report['fees']:.2f}, fines {report['fines']:.2f}.\n"
+        f"Open on {report['today']}: {report['open']} borrowings, "
+        f"{report['overdue']} overdue, accrued fees {report['accrued_fees']:.2f}, "
+        f"accrued fines {report['accrued_fines']:.2f}."
+    )
@@ -0,0 +1,165 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from books.models import Book
+from borrowings.models import Borrowing
+from library_service.benchmark import (
+    run_benchmark,
+    run_connection_benchmark,
+    run_serializer_benchmark,
+    slow_clients,
+    throttling_disabled,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p95/p99 latency and requests per second of the books list, "
+        "borrowings list, borrow, return and the overdue task, and save the "
+        "results as JSON. Borrow and return write to the database, so run it "
+        "against seeded data (see seed_library), not production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per scenario.",
+        )
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                "Requests go through Django's test client in this process "
+                "when omitted. Raise THROTTLE_USER_RATE on that server."
+            ),
+        )
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=0,
+            help=(
+                "Connections kept busy with slowly sent requests while "
+                "measuring, to compare sync and async servers. Needs --url."
+            ),
+        )
+        parser.add_argument(
+            "--connections",
+            action="store_true",
+            help=(
+                "Measure the cost of a new DB connection per request against "
+                "a persistent one instead of the API scenarios."
+            ),
+        )
+        parser.add_argument(
+            "--serializers",
+            action="store_true",
+            help=(
+                "Measure rendering a list page through DRF serializers against "
+                "the values() and orjson fast path instead of the API scenarios; "
+                "--requests is the number of pages rendered."
+            ),
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=500,
+            help="Rows per page with --serializers.",
+        )
+        parser.add_argument("--user", help="Email of the reader to borrow as.")
+        parser.add_argument(
+            "--output",
+            help="File to save the results to, benchmark-<timestamp>.json by default.",
+        )
+        parser.add_argument(
+            "--baseline", help="Results file of an earlier run to compare with."
+        )
+
+    def handle(self, *args, **options):
+        if options["slow_clients"] and not options["url"]:
+            raise CommandError("--slow-clients needs --url.")
+
+        started_at = timezone.now()
+        if options["connections"]:
+            scenarios = run_connection_benchmark(options["requests"])
+        elif options["serializers"]:
+            scenarios = run_serializer_benchmark(options["requests"], options["rows"])
+        else:
+            scenarios = self.run_api_benchmark(options)
+
+        results = {
+            "started_at": started_at.isoformat(),
+            "target": options["url"] or "in-process",
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "db_pool": "pool" in connection.settings_dict.get("OPTIONS", {}),
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "slow_clients": options["slow_clients"],
+            "dataset": {
+                "users": get_user_model().objects.count(),
+                "books": Book.objects.count(),
+                "borrowings": Borrowing.objects.count(),
+            },
+            "scenarios": scenarios,
+        }
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)["scenarios"]
+
+        self.write_report(scenarios, baseline)
+
+        output = options["output"] or (f"benchmark-{started_at:%Y%m%dT%H%M%S}.json")
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
+
+    def run_api_benchmark(self, options):
+        readers = get_user_model().objects.filter(is_active=True, is_staff=False)
+        if options["user"]:
+            readers = readers.filter(email=options["user"])
+        reader = readers.order_by("id").first()
+        if reader is None:
+            raise CommandError("No reader to benchmark with, run seed_library first.")
+
+        if options["url"]:
+            with slow_clients(options["url"], options["slow_clients"]):
+                return run_benchmark(
+                    reader,
+                    options["requests"],
+                    options["concurrency"],
+                    base_url=options["url"],
+                )
+        with throttling_disabled():
+            return run_benchmark(reader, options["requests"], options["concurrency"])
+
+    def write_report(self, scenarios, baseline=None):
+        self.stdout.write(
+            f"{'scenario':<24}{'requests':>9}{'errors':>8}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'p99 ms':>9}{'rps':>9}"
+            + (f"{'p95 vs base':>13}{'rps vs base':>13}" if baseline else "")
+        )
+        for name, result in scenarios.items():
+            if not result["requests"]:
+                self.stdout.write(f"{name:<24}{0:>9}")
+                continue
+            line = (
+                f"{name:<24}{result['requests']:>9}{result['errors']:>8}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}{result['rps']:>9.1f}"
+            )
+            before = (baseline or {}).get(name)
+            if before and before["requests"]:
+                line += f"{change(before['p95_ms'], result['p95_ms']):>13}"
+                line += f"{change(before['rps'], result['rps']):>13}"
+            self.stdout.write(line)
+
+
+def change(before, after):
+    return f"{(after - before) / before:+.1%}" if before else "n/a"
@@ -0,0 +1,172 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from books.models import Book
+from books.search import search_books
+from borrowings.models import Borrowing
+from borrowings.pagination import BorrowingPagination
+from borrowings.tasks import overdue_borrowings
+from borrowings.views import BorrowingViewSet
+from library_service.seeding import seed_library
+
+INDEX_NODES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+# Pages after a cursor must start the index scan at the cursor, with an index
+# condition, rather than read the index from the start and filter.
+SEEK_QUERIES = {"staff borrowings page after cursor"}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def hot_queries():
+    """Yield ``(name, table, queryset)`` for the queries the API runs most."""
+    today = timezone.now().date()
+    borrowings = BorrowingViewSet.queryset.order_by("-borrow_date", "-id")
+    user_id = (
+        Borrowing.objects.order_by("-id").values_list("user_id", flat=True).first()
+    )
+    title = (
+        Book.objects.order_by("-id").values_list("title", flat=True).first() or "book"
+    )
+
+    yield (
+        "overdue scan",
+        Borrowing._meta.db_table,
+        overdue_borrowings(today)
+        .order_by("id")
+        .values_list("id", "user__email", "borrow_date", "expected_return_date"),
+    )
+    yield "staff borrowings page", Borrowing._meta.db_table, borrowings[:6]
+    cursor = next(
+        iter(borrowings.values_list("borrow_date", "id")[1000:1001]), (today, 0)
+    )
+    yield (
+        "staff borrowings page after cursor",
+        Borrowing._meta.db_table,
+        borrowings.filter(BorrowingPagination().get_keyset_filter(cursor))[:6],
+    )
+    yield (
+        "user borrowings page",
+        Borrowing._meta.db_table,
+        borrowings.filter(user_id=user_id)[:6],
+    )
+    yield (
+        "user active borrowings page",
+        Borrowing._meta.db_table,
+        borrowings.filter(user_id=user_id, actual_return_date__isnull=True)[:6],
+    )
+    yield (
+        "user borrowings delta page",
+        Borrowing._meta.db_table,
+        Borrowing.objects.filter(
+            user_id=user_id, updated_at__gt=timezone.now() - timedelta(minutes=5)
+        ).order_by("updated_at", "id")[:101],
+    )
+    yield (
+        "user borrowings count",
+        Borrowing._meta.db_table,
+        Borrowing.objects.filter(user_id=user_id),
+    )
+    yield (
+        "book search",
+        Book._meta.db_table,
+        search_books(Book.objects.all(), " ".join(title.split()[:3])).order_by(
+            "-rank", "id"
+        )[:16],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot borrowing and book queries and check each one uses an "
+        "index. Plans depend on table size, so run it against production-sized "
+        "data or pass --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help=(
+                "Seed this many books and borrowings first. They are rolled back "
+                "afterwards; vacuum before running again on the same database."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                f"Query plans are checked on PostgreSQL, not {connection.vendor}."
+            )
+        failures = []
+
+        with transaction.atomic():
+            if options["seed"]:
+                seed_library(
+                    users=max(options["seed"] // 50, 1),
+                    books=options["seed"],
+                    borrowings=options["seed"],
+                    active_ratio=0.05,
+                    seed=0,
+                )
+                # Leave the tables as autovacuum would: fresh statistics and
+                # the GIN pending list merged into the search index.
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"ANALYZE {Book._meta.db_table}, {Borrowing._meta.db_table}"
+                    )
+                    cursor.execute(
+                        "SELECT gin_clean_pending_list(%s::regclass)",
+                        ["book_search_vector_idx"],
+                    )
+
+            for name, table, queryset in hot_queries():
+                if not queryset.query.is_sliced:
+                    queryset = queryset.order_by()
+                if options["verbosity"] > 1:
+                    self.stdout.write(queryset.explain())
+                plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                nodes = list(plan_nodes(plan))
+                index_nodes = [
+                    node
+                    for node in nodes
+                    if node["Node Type"] in INDEX_NODES
+                    and node.get("Relation Name", table) == table
+                ]
+                indexes = sorted({node["Index Name"] for node in index_nodes})
+                if name in SEEK_QUERIES and not any(
+                    "Index Cond" in node for node in index_nodes
+                ):
+                    failures.append(name)
+                    self.stdout.write(
+                        self.style.ERROR(f"FAIL  {name}: index scan isn't bounded")
+                    )
+                    continue
+                sequential = any(
+                    node["Node Type"] == "Seq Scan"
+                    and node.get("Relation Name") == table
+                    for node in nodes
+                )
+
+                if indexes and not sequential:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"OK    {name}: {', '.join(indexes)}")
+                    )
+                else:
+                    failures.append(name)
+                    self.stdout.write(
+                        self.style.ERROR(f"FAIL  {name}: sequential scan on {table}")
+                    )
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"No usable index scan for: {', '.join(failures)}")
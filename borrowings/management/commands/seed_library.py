@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from library_service.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = "Insert synthetic users, books and borrowings for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--books", type=int, default=1000)
+        parser.add_argument("--borrowings", type=int, default=10000)
+        parser.add_argument(
+            "--active-ratio",
+            type=float,
+            default=0.15,
+            help="Share of borrowings that are not returned yet.",
+        )
+        parser.add_argument(
+            "--overdue-ratio",
+            type=float,
+            default=0.3,
+            help="Share of open borrowings past their expected return date.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Random seed for repeatable data."
+        )
+
+    def handle(self, *args, **options):
+        counts = seed_library(
+            users=options["users"],
+            books=options["books"],
+            borrowings=options["borrowings"],
+            active_ratio=options["active_ratio"],
+            overdue_ratio=options["overdue_ratio"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created {users} users, {books} books and "
+                "{borrowings} borrowings.".format(**counts)
+            )
+        )
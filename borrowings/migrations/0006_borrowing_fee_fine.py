@@ -0,0 +1,57 @@
+# Generated by Django 5.1.5 on 2026-10-18 05:57
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+UPDATE borrowings_borrowing borrowing
+SET
+    fee = round(
+        greatest(borrowing.actual_return_date - borrowing.borrow_date, 1)
+        * book.daily_fee,
+        2
+    ),
+    fine = round(
+        greatest(
+            borrowing.actual_return_date - borrowing.expected_return_date, 0
+        ) * book.daily_fee * %s,
+        2
+    )
+FROM books_book book
+WHERE book.id = borrowing.book_id AND borrowing.actual_return_date IS NOT NULL
+"""
+
+
+def backfill(apps, schema_editor):
+    # Only PostgreSQL databases can predate the columns; SQLite ones are new.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            BACKFILL_SQL, [Decimal(settings.BORROWING_FINE_MULTIPLIER)]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0005_borrowing_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="borrowing",
+            name="fee",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=12, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="fine",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=12, null=True
+            ),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from books.models import Book
+from borrowings.fees import calculate_fees
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -12,17 +14,212 @@ class Borrowing(models.Model):
     actual_return_date = models.DateField(null=True, blank=True)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="borrowings")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="borrowings")
+    fee = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    fine = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    # Watermark for delta sync and ETags. Bulk updates must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.email} borrowed " f"{self.book.title} on {self.borrow_date}"
 
     class Meta:
-        ordering = ["-borrow_date"]
+        ordering = ["-borrow_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["-borrow_date", "-id"], name="borrowing_borrow_date_id_idx"
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "-id"],
+                name="borrowing_user_date_idx",
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "-id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_open_user_date_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_open_due_idx",
+            ),
+            models.Index(fields=["updated_at", "id"], name="borrowing_updated_idx"),
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                name="borrowing_user_updated_idx",
+            ),
+        ]
 
     def return_book(self):
+        from borrowings.events import book_returned, publish
+        from borrowings.reservations import allocate_copies
+
         if self.actual_return_date is not None:
             raise ValueError("This book has already been returned.")
-        self.actual_return_date = timezone.now().date()
-        self.book.inventory += 1
-        self.book.save()
-        self.save()
+        now = timezone.now()
+        return_date = now.date()
+        fee, fine = calculate_fees(
+            self.borrow_date,
+            self.expected_return_date,
+            return_date,
+            self.book.daily_fee,
+        )
+
+        with transaction.atomic():
+            returned = Borrowing.objects.filter(
+                pk=self.pk, actual_return_date__isnull=True
+            ).update(actual_return_date=return_date, fee=fee, fine=fine, updated_at=now)
+            if not returned:
+                raise ValueError("This book has already been returned.")
+            allocate_copies([self.book_id])
+            publish(
+                [
+                    book_returned(
+                        self.pk,
+                        self.book_id,
+                        self.borrow_date,
+                        self.expected_return_date,
+                        return_date,
+                    )
+                ]
+            )
+
+        self.actual_return_date = return_date
+        self.fee = fee
+        self.fine = fine
+        self.updated_at = now
+
+
+class Reservation(models.Model):
+    """A place in a book's waitlist.
+
+    Waiting reservations are served first come, first served as copies are
+    returned: the copy is held for the reservation, which is ``READY`` to be
+    claimed by borrowing the book until ``expires_at``.
+    """
+
+    class StatusChoices(models.TextChoices):
+        WAITING = "WAITING", "Waiting"
+        READY = "READY", "Ready"
+        FULFILLED = "FULFILLED", "Fulfilled"
+        EXPIRED = "EXPIRED", "Expired"
+        CANCELLED = "CANCELLED", "Cancelled"
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="reservations"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="reservations"
+    )
+    status = models.CharField(
+        max_length=9,
+        choices=StatusChoices.choices,
+        default=StatusChoices.WAITING,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return (
+            f"{self.status} reservation of book {self.book_id} by user {self.user_id}"
+        )
+
+    class Meta:
+        ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(status__in=["WAITING", "READY"]),
+                name="reservation_active_unique",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["book", "created_at", "id"],
+                condition=models.Q(status="WAITING"),
+                name="reservation_queue_idx",
+            ),
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(status="READY"),
+                name="reservation_expiry_idx",
+            ),
+        ]
+
+
+class Notification(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        SENT = "SENT", "Sent"
+        FAILED = "FAILED", "Failed"
+
+    chat_id = models.CharField(max_length=64)
+    text = models.TextField()
+    status = models.CharField(
+        max_length=7,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.status} notification for chat {self.chat_id}"
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="PENDING"),
+                name="notification_pending_idx",
+            )
+        ]
+
+
+class OutboxEvent(models.Model):
+    """A domain event waiting to be handled by one consumer.
+
+    Events are written in the same transaction as the change they describe,
+    one row per consumer, and relayed in batches by ``relay_events``.
+    """
+
+    class EventTypeChoices(models.TextChoices):
+        BORROWING_CREATED = "BorrowingCreated", "Borrowing created"
+        BOOK_RETURNED = "BookReturned", "Book returned"
+        INVENTORY_CHANGED = "InventoryChanged", "Inventory changed"
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        PROCESSED = "PROCESSED", "Processed"
+        FAILED = "FAILED", "Failed"
+
+    event_type = models.CharField(max_length=32, choices=EventTypeChoices.choices)
+    consumer = models.CharField(max_length=32)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=9,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.status} {self.event_type} event for {self.consumer}"
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="PENDING"),
+                name="outboxevent_pending_idx",
+            )
+        ]
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from library_service.metrics import NOTIFICATION_SEND_DURATION
+from .models import Notification
+from .telegram_helper import (
+    TelegramError,
+    TelegramRateLimited,
+    asend_telegram_message,
+    batch_messages,
+    get_async_client,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def borrowing_created_message(book_title, email, expected_return_date):
+    return (
+        f"New borrowing created!\n"
+        f"Book title: {book_title}\n"
+        f"User: {email}\n"
+        f"Expected return date: {expected_return_date}"
+    )
+
+
+def enqueue_notification(text, chat_id=None):
+    """Store a message in the outbox; it is delivered after the commit."""
+    return enqueue_notifications([text], chat_id=chat_id)[0]
+
+
+def enqueue_notifications(texts, chat_id=None, schedule=True):
+    chat_id = chat_id or settings.TELEGRAM_CHAT_ID or ""
+    notifications = Notification.objects.bulk_create(
+        Notification(chat_id=chat_id, text=text) for text in texts
+    )
+    if schedule:
+        transaction.on_commit(schedule_delivery)
+    return notifications
+
+
+def schedule_delivery(countdown=None):
+    from .tasks import deliver_notifications
+
+    try:
+        deliver_notifications.apply_async(countdown=countdown)
+    except Exception as e:
+        # The outbox keeps the messages, beat's sweep will pick them up.
+        logger.warning(f"Failed to schedule notification delivery: {e}")
+
+
+def retry_delay(attempts):
+    return min(
+        settings.NOTIFICATION_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.NOTIFICATION_RETRY_BACKOFF_MAX,
+    )
+
+
+def deliver_pending_notifications(batch_size=None):
+    """Send due outbox messages, one batched Telegram message per chat.
+
+    A batch is claimed in a short transaction, locking rows with ``SKIP
+    LOCKED`` and moving their next attempt ``NOTIFICATION_CLAIM_TIMEOUT``
+    seconds ahead, so concurrent workers never send the same notification
+    twice. Messages are sent with no transaction open and the results are
+    recorded in a second one; a worker dying in between leaves its claim to
+    expire and the batch is sent again. Returns the number of seconds after
+    which delivery should run again, or ``None`` when nothing needs a retry.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    pending = _claim_notifications(batch_size)
+    retry_in = 0 if len(pending) == batch_size else None
+
+    by_chat = defaultdict(list)
+    for notification in pending:
+        by_chat[notification.chat_id].append(notification)
+
+    sent, failed = [], []
+    for chat_retry_in in async_to_sync(_deliver_to_chats)(by_chat, sent, failed):
+        if chat_retry_in is not None:
+            retry_in = (
+                chat_retry_in if retry_in is None else min(retry_in, chat_retry_in)
+            )
+
+    with transaction.atomic():
+        Notification.objects.filter(pk__in=[n.pk for n in sent]).update(
+            status=Notification.StatusChoices.SENT, sent_at=timezone.now()
+        )
+        Notification.objects.bulk_update(
+            failed, ["status", "attempts", "next_attempt_at", "last_error"]
+        )
+
+    logger.info(f"Delivered {len(sent)} notifications, {len(failed)} deferred.")
+    return retry_in
+
+
+def _claim_notifications(batch_size):
+    """Lock up to ``batch_size`` due notifications and postpone their retry."""
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status=Notification.StatusChoices.PENDING, next_attempt_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        claimed_until = now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+        Notification.objects.filter(pk__in=[n.pk for n in pending]).update(
+            next_attempt_at=claimed_until
+        )
+    return pending
+
+
+async def _deliver_to_chats(by_chat, sent, failed):
+    """Deliver to every chat concurrently, each chat's batches in order."""
+    async with get_async_client() as client:
+        return await asyncio.gather(
+            *(
+                _deliver_to_chat(client, chat_id, notifications, sent, failed)
+                for chat_id, notifications in by_chat.items()
+            )
+        )
+
+
+async def _deliver_to_chat(client, chat_id, notifications, sent, failed):
+    interval = settings.NOTIFICATION_SEND_INTERVAL
+    last_sent_at = None
+    delivered = set()
+    batches = batch_messages([n.text for n in notifications])
+    # A message longer than the Telegram limit spans several batches and
+    # only counts as delivered once its last part went out.
+    last_batch = {
+        index: position
+        for position, (_, indexes) in enumerate(batches)
+        for index in indexes
+    }
+
+    for position, (text, indexes) in enumerate(batches):
+        if last_sent_at is not None and interval:
+            await asyncio.sleep(max(0, interval - (time.monotonic() - last_sent_at)))
+
+        started = time.perf_counter()
+        try:
+            await asend_telegram_message(client, text, chat_id=chat_id)
+        except TelegramRateLimited as e:
+            NOTIFICATION_SEND_DURATION.labels("rate_limited").observe(
+                time.perf_counter() - started
+            )
+            # Rate limits do not count as failed attempts.
+            rest = [n for n in notifications if n.pk not in delivered]
+            _defer(rest, e.retry_after, str(e))
+            failed.extend(rest)
+            return e.retry_after
+        except (TelegramError, httpx.HTTPError) as e:
+            NOTIFICATION_SEND_DURATION.labels("failed").observe(
+                time.perf_counter() - started
+            )
+            logger.error(f"Failed to send message to chat {chat_id}: {e}")
+            rest = [n for n in notifications if n.pk not in delivered]
+            for notification in rest:
+                notification.attempts += 1
+                if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                    notification.status = Notification.StatusChoices.FAILED
+            retrying = [
+                n for n in rest if n.status == Notification.StatusChoices.PENDING
+            ]
+            delay = retry_delay(min(n.attempts for n in retrying)) if retrying else 0
+            _defer(rest, delay, str(e))
+            failed.extend(rest)
+            return delay if retrying else None
+
+        NOTIFICATION_SEND_DURATION.labels("sent").observe(time.perf_counter() - started)
+        last_sent_at = time.monotonic()
+        for index in indexes:
+            if last_batch[index] == position:
+                delivered.add(notifications[index].pk)
+                sent.append(notifications[index])
+
+    return None
+
+
+def _defer(notifications, delay, error):
+    next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    for notification in notifications:
+        notification.next_attempt_at = next_attempt_at
+        notification.last_error = error
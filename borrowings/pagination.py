@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.response import Response
+
+from library_service.pagination import KeysetPagination
+
+
+class BorrowingPagination(KeysetPagination):
+    page_size = 5
+    ordering = ("-borrow_date", "-id")
+
+
+class BorrowingSyncPagination(KeysetPagination):
+    """Delta sync: the borrowings changed after the ``since`` cursor.
+
+    Rows come oldest change first, with ``next`` for the rest of a large
+    delta. The last page returns the ``since`` cursor to poll with next,
+    ``DELTA_SYNC_OVERLAP`` seconds ago: changes from that window are sent
+    again, so a transaction that commits after the poll with an older
+    ``updated_at`` isn't skipped.
+    """
+
+    page_size = 100
+    ordering = ("updated_at", "id")
+    cursor_query_param = "since"
+    cursor_query_description = (
+        "Return only the borrowings changed after this cursor, taken from the "
+        "since of the previous response. Empty for a first full sync."
+    )
+    include_count = False
+
+    def decode_cursor(self, request, queryset):
+        cursor = super().decode_cursor(request, queryset)
+        # Deltas are only read forwards.
+        return cursor and (cursor[0], False)
+
+    def get_page(self, results, values, reverse):
+        results = super().get_page(results, values, reverse)
+        self.since_values = self.next_values or [
+            timezone.now() - timedelta(seconds=settings.DELTA_SYNC_OVERLAP),
+            0,
+        ]
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "since": self.encode_cursor_value(self.since_values),
+                "results": data,
+            }
+        )
+
+
+class ReservationPagination(KeysetPagination):
+    page_size = 10
+    ordering = ("-id",)
@@ -0,0 +1,147 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from books.inventory import release_copies, reserve_copies
+from .events import inventory_changed, publish
+from .models import Reservation
+from .notifications import enqueue_notifications
+
+logger = logging.getLogger(__name__)
+
+# Sent after the commit with the ``reservations`` that became ready, with
+# their book and user loaded, for extra channels besides the outbox message.
+reservation_ready = Signal()
+
+
+def reservation_ready_message(book_title, email, expires_at):
+    return (
+        f"Reserved book is ready!\n"
+        f"Book title: {book_title}\n"
+        f"User: {email}\n"
+        f"Borrow it before: {expires_at:%Y-%m-%d %H:%M}"
+    )
+
+
+def allocate_copies(book_ids):
+    """Hand returned copies to the longest waiting reservations.
+
+    Every entry of ``book_ids`` is a copy coming back. The oldest waiting
+    reservations of the book get it and become ready to be claimed within
+    ``RESERVATION_CLAIM_WINDOW`` seconds; copies nobody waits for go back
+    on the shelf. Must run inside a transaction. Returns the ready
+    reservations.
+    """
+    copies = Counter(book_ids)
+    if not copies:
+        return []
+    publish(inventory_changed(copies))
+    # Releasing first locks the book rows, so a reservation queued while
+    # the book looked out of stock is committed before the check below.
+    release_copies(copies.elements())
+    waiting_books = set(
+        Reservation.objects.filter(
+            book_id__in=copies, status=Reservation.StatusChoices.WAITING
+        ).values_list("book_id", flat=True)
+    )
+    if not waiting_books:
+        return []
+
+    allocated = []
+    for book_id in sorted(waiting_books):
+        allocated += (
+            Reservation.objects.select_for_update()
+            .filter(book_id=book_id, status=Reservation.StatusChoices.WAITING)
+            .order_by("created_at", "id")
+            .values_list("id", "book_id")[: copies[book_id]]
+        )
+    reserve_copies(book_id for _, book_id in allocated)
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.RESERVATION_CLAIM_WINDOW)
+    ready = Reservation.objects.filter(pk__in=[pk for pk, _ in allocated])
+    ready.update(
+        status=Reservation.StatusChoices.READY, ready_at=now, expires_at=expires_at
+    )
+    reservations = list(ready.select_related("book", "user"))
+
+    enqueue_notifications(
+        reservation_ready_message(
+            reservation.book.title, reservation.user.email, expires_at
+        )
+        for reservation in reservations
+    )
+    transaction.on_commit(lambda: _reservations_ready(reservations, expires_at))
+    return reservations
+
+
+def _reservations_ready(reservations, expires_at):
+    from .tasks import expire_reservations
+
+    reservation_ready.send(sender=Reservation, reservations=reservations)
+    try:
+        expire_reservations.apply_async(eta=expires_at)
+    except Exception as e:
+        # Beat's sweep expires them anyway.
+        logger.warning(f"Failed to schedule reservation expiry: {e}")
+
+
+def claim_reservations(user_id, book_ids):
+    """Fulfil the user's ready reservations of ``book_ids``.
+
+    Returns the ids of the books claimed, whose held copy the new borrowing
+    takes instead of one from the shelf.
+    """
+    claimed = list(
+        Reservation.objects.select_for_update()
+        .filter(
+            user_id=user_id,
+            book_id__in=set(book_ids),
+            status=Reservation.StatusChoices.READY,
+        )
+        .values_list("id", "book_id")
+    )
+    if claimed:
+        Reservation.objects.filter(pk__in=[pk for pk, _ in claimed]).update(
+            status=Reservation.StatusChoices.FULFILLED
+        )
+    return {book_id for _, book_id in claimed}
+
+
+def release_reservations(reservations, status):
+    """End ready or waiting ``reservations`` (``(id, book_id, status)``).
+
+    Copies held for the ready ones go to the next in line. Must run inside
+    a transaction.
+    """
+    if not reservations:
+        return
+    Reservation.objects.filter(pk__in=[pk for pk, _, _ in reservations]).update(
+        status=status
+    )
+    allocate_copies(
+        book_id
+        for _, book_id, current in reservations
+        if current == Reservation.StatusChoices.READY
+    )
+
+
+def expire_due_reservations(now=None):
+    """Expire the ready reservations not claimed in time.
+
+    Returns the number of reservations expired.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            Reservation.objects.select_for_update(skip_locked=True)
+            .filter(status=Reservation.StatusChoices.READY, expires_at__lte=now)
+            .values_list("id", "book_id", "status")
+        )
+        release_reservations(expired, Reservation.StatusChoices.EXPIRED)
+    return len(expired)
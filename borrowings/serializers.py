@@ -1,12 +1,26 @@
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
 from rest_framework import serializers
 from datetime import date
 
-from .models import Borrowing
+from .fees import calculate_fees
+from .models import Borrowing, Reservation
+from .events import book_returned, borrowing_created, inventory_changed, publish
+from .reservations import allocate_copies, claim_reservations
+from books.inventory import reserve_copies, reserve_copy
+from books.models import Book
 from books.serializers import BookSerializer
+from library_service.fieldsets import SparseFieldsetMixin
+from library_service.timing import TimedSerializerMixin
 from user.serializers import UserSerializer
 
+BULK_MAX_ITEMS = 50
 
-class BorrowingSerializer(serializers.ModelSerializer):
+
+class BorrowingSerializer(
+    SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer
+):
     book = BookSerializer(read_only=True)
     user = UserSerializer(read_only=True)
 
@@ -17,12 +31,14 @@ class BorrowingSerializer(serializers.ModelSerializer):
             "borrow_date",
             "expected_return_date",
             "actual_return_date",
+            "fee",
+            "fine",
             "book",
             "user",
         ]
 
 
-class BorrowingCreateSerializer(serializers.ModelSerializer):
+class BorrowingCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -30,7 +46,15 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "book", "expected_return_date"]
 
     def validate_book(self, value):
-        if value.inventory < 1:
+        # A ready reservation holds a copy that isn't counted in inventory.
+        if (
+            value.inventory < 1
+            and not Reservation.objects.filter(
+                book=value,
+                user_id=self.context["request"].user.id,
+                status=Reservation.StatusChoices.READY,
+            ).exists()
+        ):
             raise serializers.ValidationError("This book is out of stock.")
         return value
 
@@ -42,19 +66,223 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        book = validated_data["book"]
-        if book.inventory < 1:
-            raise serializers.ValidationError("This book is out of stock.")
+        book_id = validated_data["book"].pk
+        with transaction.atomic():
+            events = []
+            if not claim_reservations(validated_data["user_id"], [book_id]):
+                if not reserve_copy(book_id):
+                    raise serializers.ValidationError("This book is out of stock.")
+                events += inventory_changed([book_id])
+            borrowing = super().create(validated_data)
+            events.append(
+                borrowing_created(
+                    borrowing,
+                    validated_data["book"].title,
+                    self.context["request"].user.email,
+                )
+            )
+            publish(events)
+            return borrowing
+
+
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    books = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+    expected_return_date = serializers.DateField()
+
+    def validate_expected_return_date(self, value):
+        if value < date.today():
+            raise serializers.ValidationError(
+                "Expected return date cannot be in the past."
+            )
+        return value
+
+    def create(self, validated_data):
+        user = validated_data["user"]
+        expected_return_date = validated_data["expected_return_date"]
+
+        with transaction.atomic():
+            claimed = claim_reservations(user.id, validated_data["books"])
+            wanted = list(validated_data["books"])
+            for book_id in claimed:
+                wanted.remove(book_id)
+            remaining = reserve_copies(wanted)
+            events = inventory_changed(
+                book_id for book_id, copies in remaining.items() if copies
+            )
+            for book_id in claimed:
+                remaining[book_id] = remaining.get(book_id, 0) + 1
+            results, borrowings = [], []
+            for book_id in validated_data["books"]:
+                if book_id not in remaining:
+                    results.append(_bulk_error(book=book_id, error="Book not found."))
+                elif not remaining[book_id]:
+                    results.append(
+                        _bulk_error(book=book_id, error="This book is out of stock.")
+                    )
+                else:
+                    remaining[book_id] -= 1
+                    results.append({"book": book_id, "status": "created"})
+                    borrowings.append(
+                        Borrowing(
+                            book_id=book_id,
+                            user_id=user.id,
+                            expected_return_date=expected_return_date,
+                        )
+                    )
 
-        book.inventory -= 1
-        book.save()
+            if borrowings:
+                Borrowing.objects.bulk_create(borrowings)
+                titles = dict(
+                    Book.objects.filter(
+                        pk__in={borrowing.book_id for borrowing in borrowings}
+                    ).values_list("pk", "title")
+                )
+                events += (
+                    borrowing_created(borrowing, titles[borrowing.book_id], user.email)
+                    for borrowing in borrowings
+                )
+            publish(events)
 
-        return super().create(validated_data)
+        created = iter(borrowings)
+        for result in results:
+            if result["status"] == "created":
+                result["id"] = next(created).id
+        return results
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+    def create(self, validated_data):
+        ids = validated_data["borrowings"]
+        now = timezone.now()
+        return_date = now.date()
+
+        with transaction.atomic():
+            found = {
+                pk: rest
+                for pk, *rest in validated_data["queryset"]
+                .select_related(None)
+                .select_for_update(of=("self",))
+                .filter(pk__in=ids)
+                .values_list(
+                    "pk",
+                    "book_id",
+                    "borrow_date",
+                    "expected_return_date",
+                    "actual_return_date",
+                    "book__daily_fee",
+                )
+            }
+            returning = {
+                pk: (book_id, borrow_date, expected_return_date)
+                for pk, (
+                    book_id,
+                    borrow_date,
+                    expected_return_date,
+                    actual_return_date,
+                    _,
+                ) in found.items()
+                if actual_return_date is None
+            }
+            fees = {
+                pk: calculate_fees(
+                    borrow_date, expected_return_date, return_date, found[pk][-1]
+                )
+                for pk, (_, borrow_date, expected_return_date) in returning.items()
+            }
+            if returning:
+                Borrowing.objects.filter(pk__in=returning).update(
+                    actual_return_date=return_date,
+                    fee=Case(
+                        *[When(pk=pk, then=Value(fee)) for pk, (fee, _) in fees.items()]
+                    ),
+                    fine=Case(
+                        *[
+                            When(pk=pk, then=Value(fine))
+                            for pk, (_, fine) in fees.items()
+                        ]
+                    ),
+                    updated_at=now,
+                )
+            allocate_copies(book_id for book_id, _, _ in returning.values())
+            publish(
+                book_returned(pk, *loan, return_date) for pk, loan in returning.items()
+            )
+
+        results, seen = [], set()
+        for pk in ids:
+            if pk not in found:
+                results.append(_bulk_error(borrowing=pk, error="Not found."))
+            elif pk in seen or pk not in returning:
+                results.append(
+                    _bulk_error(
+                        borrowing=pk, error="This book has already been returned."
+                    )
+                )
+            else:
+                fee, fine = fees[pk]
+                results.append(
+                    {
+                        "borrowing": pk,
+                        "status": "returned",
+                        "fee": str(fee),
+                        "fine": str(fine),
+                    }
+                )
+            seen.add(pk)
+        return results
+
+
+def _bulk_error(error, **item):
+    return {**item, "status": "failed", "error": error}
 
 
 class BorrowingReturnSerializer(serializers.Serializer):
     def update(self, instance, validated_data):
-        if instance.actual_return_date is not None:
-            raise serializers.ValidationError("This book has already been returned.")
-        instance.return_book()
+        try:
+            instance.return_book()
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
         return instance
+
+
+class ReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Reservation
+        fields = ["id", "book", "status", "created_at", "ready_at", "expires_at"]
+        read_only_fields = ["status", "created_at", "ready_at", "expires_at"]
+
+    def create(self, validated_data):
+        book = validated_data["book"]
+        with transaction.atomic():
+            # Locking the book orders this against returns of its copies.
+            inventory = (
+                Book.objects.select_for_update()
+                .values_list("inventory", flat=True)
+                .get(pk=book.pk)
+            )
+            if inventory > 0:
+                raise serializers.ValidationError(
+                    {"book": ["This book is in stock, borrow it instead."]}
+                )
+            if Reservation.objects.filter(
+                book=book,
+                user_id=validated_data["user_id"],
+                status__in=[
+                    Reservation.StatusChoices.WAITING,
+                    Reservation.StatusChoices.READY,
+                ],
+            ).exists():
+                raise serializers.ValidationError(
+                    {"book": ["You have already reserved this book."]}
+                )
+            return super().create(validated_data)
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+
+# User fields nested in borrowing responses.
+BORROWING_USER_FIELDS = {"email", "first_name", "last_name", "is_staff"}
+
+
+@receiver(post_save, sender=get_user_model())
+def touch_user_borrowings(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    """Send the user's borrowings again to delta syncs and expire their ETags."""
+    if created or raw:
+        return
+    if update_fields is not None and not BORROWING_USER_FIELDS & set(update_fields):
+        return
+    Borrowing.objects.filter(user=instance).update(updated_at=timezone.now())
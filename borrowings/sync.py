@@ -0,0 +1,102 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from rest_framework import status
+from rest_framework.response import Response
+
+from books.cache import get_catalog_version, is_not_modified
+from books.serializers import BookSerializer
+
+SINCE_QUERY_PARAM = "since"
+
+
+def borrowings_etag(request, *state):
+    """ETag of a borrowings response: its URL, user and format, and ``state``."""
+    key = (
+        request.get_full_path(),
+        request.user.pk,
+        request.accepted_renderer.format,
+        *state,
+    )
+    return f'"{hashlib.md5(repr(key).encode()).hexdigest()}"'
+
+
+class BorrowingSyncMixin:
+    """ETag revalidation for list and retrieve, and delta sync with ``?since=``.
+
+    A list's ETag covers the number of rows it's filtered to and their
+    latest ``updated_at``, read by the query that counts them for the
+    paginator, so an unchanged poll costs that query and a 304. A row
+    leaving the filter lowers the count, any other change moves the
+    watermark. A retrieve's ETag covers the row's ``updated_at``. Both also
+    cover the catalog version when books are nested, as their inventory
+    changes without touching the borrowing.
+    """
+
+    fieldset_extra_fields = ("updated_at",)
+
+    @property
+    def is_delta_sync(self):
+        return self.action == "list" and SINCE_QUERY_PARAM in self.request.query_params
+
+    def nests_books(self):
+        return isinstance(self.get_serializer().fields.get("book"), BookSerializer)
+
+    def get_state_aggregates(self):
+        return {"count": Count("id"), "modified": Max("updated_at")}
+
+    def not_modified(self, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(**self.get_state_aggregates())
+        catalog = get_catalog_version()[0] if self.nests_books() else None
+        etag = borrowings_etag(request, state["count"], state["modified"], catalog)
+        if is_not_modified(request, etag):
+            return self.not_modified(etag)
+
+        if self.paginator is not None:
+            self.paginator.known_count = state["count"]
+        response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        catalog = get_catalog_version()[0] if self.nests_books() else None
+        etag = borrowings_etag(request, instance.updated_at, catalog)
+        if is_not_modified(request, etag):
+            return self.not_modified(etag)
+        return Response(self.get_serializer(instance).data, headers={"ETag": etag})
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        state = await queryset.order_by().aaggregate(**self.get_state_aggregates())
+        catalog = (
+            (await sync_to_async(get_catalog_version)())[0]
+            if self.nests_books()
+            else None
+        )
+        etag = borrowings_etag(request, state["count"], state["modified"], catalog)
+        if is_not_modified(request, etag):
+            return self.not_modified(etag)
+
+        if self.paginator is not None:
+            self.paginator.known_count = state["count"]
+        response = await super().alist(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        catalog = (
+            (await sync_to_async(get_catalog_version)())[0]
+            if self.nests_books()
+            else None
+        )
+        etag = borrowings_etag(request, instance.updated_at, catalog)
+        if is_not_modified(request, etag):
+            return self.not_modified(etag)
+        return Response(self.get_serializer(instance).data, headers={"ETag": etag})
@@ -1,47 +1,161 @@
-from datetime import date
+from datetime import date, timedelta
 
-from celery import shared_task
+from celery import group, shared_task
+from django.conf import settings
+from django.db.models import Max, Min
 from django.utils import timezone
+from .fees import annotate_fees, billing_report, render_billing_report
 from .models import Borrowing
-from .telegram_helper import send_telegram_message
+from .events import relay_pending_events
+from .reservations import expire_due_reservations
+from .notifications import (
+    deliver_pending_notifications,
+    enqueue_notification,
+    enqueue_notifications,
+    schedule_delivery,
+)
+from .telegram_helper import MESSAGE_SEPARATOR, TELEGRAM_MESSAGE_LIMIT
 from celery.utils.log import get_task_logger
 
 logger = get_task_logger(__name__)
 
 
+def overdue_borrowings(today):
+    return Borrowing.objects.filter(
+        expected_return_date__lte=today, actual_return_date__isnull=True
+    )
+
+
+def render_overdue_message(
+    borrowing_id, email, borrow_date, expected_return_date, fine, today
+):
+    days_overdue = (today - expected_return_date).days
+    return (
+        f"Overdue borrowing: borrowing id - {borrowing_id}.\n"
+        f"Borrowed by {email}.\n"
+        f"Borrowed date {borrow_date}.\n"
+        f"Expected return date: {expected_return_date}.\n"
+        f"Overdue: {days_overdue} days.\n"
+        f"Fine so far: {fine:.2f}."
+    )
+
+
+def scan_overdue(queryset, today):
+    """Stream overdue rows and queue them as digest notifications.
+
+    Rows are read with a single joined query through a server-side cursor,
+    so memory stays flat however many loans are open; the fine accrued so
+    far is computed by the database in the same query. Returns the number
+    of overdue borrowings found.
+    """
+    rows = (
+        annotate_fees(queryset, today)
+        .order_by("id")
+        .values_list(
+            "id", "user__email", "borrow_date", "expected_return_date", "accrued_fine"
+        )
+        .iterator(chunk_size=settings.OVERDUE_CHUNK_SIZE)
+    )
+    total = 0
+    digests, digest = [], ""
+
+    for row in rows:
+        total += 1
+        message = render_overdue_message(*row, today)
+        if digest and len(digest) + len(MESSAGE_SEPARATOR) + len(message) > (
+            TELEGRAM_MESSAGE_LIMIT
+        ):
+            digests.append(digest)
+            digest = ""
+        digest = f"{digest}{MESSAGE_SEPARATOR}{message}" if digest else message
+
+        if len(digests) >= settings.OVERDUE_DIGESTS_PER_FLUSH:
+            enqueue_notifications(digests, schedule=False)
+            digests = []
+
+    if digest:
+        digests.append(digest)
+    if digests:
+        enqueue_notifications(digests, schedule=False)
+    if total:
+        schedule_delivery()
+    return total
+
+
 @shared_task
-def check_overdue_borrowings():
+def check_overdue_borrowings(fan_out=False):
     logger.info("Task 'check_overdue_borrowings' started.")
     today = timezone.now().date()
     logger.info(f"Today's date: {today}")
 
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lte=today, actual_return_date__isnull=True
-    )
+    overdue = overdue_borrowings(today)
 
-    logger.info(f"Found {overdue_borrowings.count()} overdue borrowings.")
-
-    if overdue_borrowings.exists():
-        for borrowing in overdue_borrowings:
-            days_overdue = (date.today() - borrowing.expected_return_date).days
-
-            message = (
-                f"Overdue borrowing: borrowing id - {borrowing.id}.\n"
-                f"Borrowed by {borrowing.user.email}.\n"
-                f"Borrowed date {borrowing.borrow_date}.\n"
-                f"Expected return date: {borrowing.expected_return_date}.\n"
-                f"Overdue: {days_overdue} days."
-            )
-            logger.info(f"Sending message: {message}")
-            try:
-                send_telegram_message(message)
-                logger.info("Message sent successfully.")
-            except Exception as e:
-                logger.error(f"Failed to send message: {e}")
+    if fan_out:
+        bounds = overdue.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is not None:
+            step = settings.OVERDUE_RANGE_SIZE
+            ranges = [
+                (start, min(start + step - 1, bounds["last"]))
+                for start in range(bounds["first"], bounds["last"] + 1, step)
+            ]
+            logger.info(f"Scanning overdue borrowings in {len(ranges)} subtasks.")
+            group(
+                scan_overdue_range.s(start, end, today.isoformat())
+                for start, end in ranges
+            ).apply_async()
+            return
+        total = 0
     else:
+        total = scan_overdue(overdue, today)
+
+    logger.info(f"Found {total} overdue borrowings.")
+
+    if not total:
         logger.info("No borrowings overdue today.")
-        try:
-            send_telegram_message("No borrowings overdue today!")
-            logger.info("Message sent successfully.")
-        except Exception as e:
-            logger.error(f"Failed to send message: {e}")
+        enqueue_notification("No borrowings overdue today!")
+
+
+@shared_task
+def scan_overdue_range(start_id, end_id, today):
+    today = date.fromisoformat(today)
+    total = scan_overdue(
+        overdue_borrowings(today).filter(id__gte=start_id, id__lte=end_id), today
+    )
+    logger.info(f"Found {total} overdue borrowings with ids {start_id}-{end_id}.")
+    return total
+
+
+@shared_task
+def send_billing_report(day=None):
+    """Notify the fees billed on ``day`` (yesterday by default) and accrued."""
+    today = timezone.now().date()
+    day = date.fromisoformat(day) if day else today - timedelta(days=1)
+    report = billing_report(day, today)
+    logger.info(
+        f"Billed {report['fees']} in fees and {report['fines']} in fines "
+        f"for {report['returned']} borrowings returned on {day}."
+    )
+    enqueue_notification(render_billing_report(report))
+
+
+@shared_task
+def deliver_notifications():
+    retry_in = deliver_pending_notifications()
+    if retry_in is not None:
+        deliver_notifications.apply_async(countdown=retry_in)
+
+
+@shared_task
+def expire_reservations():
+    expired = expire_due_reservations()
+    if expired:
+        logger.info(f"Expired {expired} unclaimed reservations.")
+
+
+@shared_task
+def relay_events():
+    full, retry_in = relay_pending_events()
+    if full:
+        relay_events.delay()
+    elif retry_in is not None:
+        relay_events.apply_async(countdown=retry_in)
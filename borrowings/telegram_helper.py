@@ -1,15 +1,85 @@
-import requests
-import os
-from dotenv import load_dotenv
+import httpx
+from django.conf import settings
 
-load_dotenv()
+TELEGRAM_MESSAGE_LIMIT = 4096
+MESSAGE_SEPARATOR = "\n\n"
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+class TelegramError(Exception):
+    pass
 
-def send_telegram_message(message):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-    response = requests.post(url, data=payload)
-    return response.json()
+
+class TelegramRateLimited(TelegramError):
+    def __init__(self, retry_after, description="Too Many Requests"):
+        super().__init__(description)
+        self.retry_after = retry_after
+
+
+def get_async_client():
+    """Return an async HTTP client pooling up to ``TELEGRAM_POOL_SIZE`` sends.
+
+    Use it as ``async with get_async_client() as client`` around one round
+    of concurrent sends; a client can't outlive its event loop.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=settings.TELEGRAM_POOL_SIZE),
+        timeout=settings.TELEGRAM_REQUEST_TIMEOUT,
+    )
+
+
+async def asend_telegram_message(client, message, chat_id=None):
+    response = await client.post(
+        send_message_url(), data=message_payload(message, chat_id)
+    )
+    return check_response(response)
+
+
+def send_message_url():
+    return f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+
+
+def message_payload(message, chat_id=None):
+    return {"chat_id": chat_id or settings.TELEGRAM_CHAT_ID, "text": message}
+
+
+def check_response(response):
+    """Return the decoded body of a Bot API response or raise ``TelegramError``."""
+    try:
+        data = response.json()
+    except ValueError:
+        raise TelegramError(f"Unexpected response with status {response.status_code}")
+
+    if response.status_code == 429:
+        retry_after = data.get("parameters", {}).get("retry_after", 1)
+        raise TelegramRateLimited(retry_after, data.get("description"))
+    if not data.get("ok"):
+        raise TelegramError(data.get("description", "Telegram request failed"))
+    return data
+
+
+def batch_messages(messages, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Group messages into as few Telegram messages as fit into ``limit``.
+
+    Returns a list of ``(text, indexes)`` tuples where ``indexes`` are the
+    positions of the source messages joined into ``text``. A single message
+    longer than ``limit`` is split over several consecutive batches.
+    """
+    batches = []
+    text, indexes = "", []
+
+    for index, message in enumerate(messages):
+        if text and len(text) + len(MESSAGE_SEPARATOR) + len(message) <= limit:
+            text += MESSAGE_SEPARATOR + message
+            indexes.append(index)
+            continue
+
+        if text:
+            batches.append((text, indexes))
+        while len(message) > limit:
+            batches.append((message[:limit], [index]))
+            message = message[limit:]
+        text, indexes = message, [index]
+
+    if text:
+        batches.append((text, indexes))
+    return batches
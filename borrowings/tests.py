@@ -1,17 +1,79 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+)
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from django.test import override_settings
+from django.utils import timezone
+from unittest import skipUnless
 from unittest.mock import patch
 from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from io import StringIO
+import base64
+import csv
+import fakeredis
+import gzip
+import json
+import redis
+import socket
+import threading
 import uuid
 
-from books.models import Book
-from borrowings.models import Borrowing
+from django_celery_beat.models import PeriodicTask
+from django_celery_beat.schedulers import ModelEntry
+
+from books.models import Book, BookStats
+from books.stats import recompute_book_stats
+from borrowings.events import relay_pending_events
+from borrowings.fees import annotate_fees, calculate_fees
+from borrowings.models import Borrowing, Notification, OutboxEvent, Reservation
+from borrowings.reservations import reservation_ready
+from borrowings.notifications import deliver_pending_notifications
+from borrowings.pagination import BorrowingSyncPagination
 from borrowings.serializers import BorrowingSerializer
+from borrowings.tasks import (
+    check_overdue_borrowings,
+    expire_reservations,
+    relay_events,
+    send_billing_report,
+)
+from borrowings.views import BorrowingViewSet
+from library_service.celery import app as celery_app
+from library_service.metrics import REGISTRY
+from library_service.benchmark import (
+    percentile,
+    run_benchmark,
+    run_connection_benchmark,
+    run_serializer_benchmark,
+    slow_clients,
+    throttling_disabled,
+)
+from library_service.renderers import ORJSONRenderer
+from library_service.testing import query_budget
+from library_service.throttling import (
+    RedisTokenBuckets,
+    ScopedRateThrottle,
+    take_token,
+)
 
 BORROWING_URL = reverse("borrowings:borrowing-list")
+BULK_URL = reverse("borrowings:borrowing-bulk-create")
+BULK_RETURN_URL = reverse("borrowings:borrowing-bulk-return")
+EXPORT_URL = reverse("borrowings:borrowing-export")
+RESERVATION_URL = reverse("borrowings:reservation-list")
 
 
 def detail_url(borrowing_id):
@@ -33,11 +95,13 @@ def sample_book(**params):
 def sample_borrowing(**params):
     defaults = {
         "expected_return_date": date.today() + timedelta(days=7),
-        "book": sample_book(),
-        "user": get_user_model().objects.create_user(
-            email=f"test {uuid.uuid4().hex[:3]} @test.com", password="testpass"
-        ),
     }
+    if "book" not in params:
+        defaults["book"] = sample_book()
+    if "user" not in params:
+        defaults["user"] = get_user_model().objects.create_user(
+            email=f"test{uuid.uuid4().hex[:8]}@test.com", password="testpass"
+        )
     defaults.update(params)
     return Borrowing.objects.create(**defaults)
 
@@ -205,15 +269,1822 @@ class TelegramNotificationTest(TestCase):
         self.client.force_authenticate(self.user)
         self.book = sample_book(inventory=5)
 
-    @patch("borrowings.views.send_telegram_message")
-    def test_send_telegram_message_on_borrowing_creation(self, mock_send):
-        """Test that Telegram message is sent when creating a borrowing"""
+    @patch("borrowings.tasks.relay_events.apply_async")
+    @patch("borrowings.tasks.deliver_notifications.apply_async")
+    def test_send_telegram_message_on_borrowing_creation(
+        self, mock_deliver, mock_relay
+    ):
+        """Test that Telegram message is queued when creating a borrowing"""
         payload = {
             "book": self.book.id,
             "expected_return_date": date.today() + timedelta(days=14),
         }
 
-        response = self.client.post(BORROWING_URL, payload)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(BORROWING_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(mock_relay.called)
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_pending_events()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, Notification.StatusChoices.PENDING)
+        self.assertIn(self.book.title, notification.text)
+        self.assertTrue(mock_deliver.called)
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, parse_qs(body.decode())))
+        status_code, data = (
+            self.server.responses.pop(0)
+            if self.server.responses
+            else (
+                200,
+                {"ok": True, "result": {}},
+            )
+        )
+        content = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NotificationDeliveryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubTelegramHandler)
+        cls.server.requests, cls.server.responses = [], []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            TELEGRAM_API_URL=f"http://127.0.0.1:{cls.server.server_port}",
+            TELEGRAM_BOT_TOKEN="token",
+            NOTIFICATION_SEND_INTERVAL=0,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.responses.clear()
+
+    def test_messages_are_batched_per_chat(self):
+        Notification.objects.create(chat_id="1", text="first")
+        Notification.objects.create(chat_id="1", text="second")
+        Notification.objects.create(chat_id="2", text="third")
+
+        retry_in = deliver_pending_notifications()
+
+        self.assertIsNone(retry_in)
+        self.assertEqual(len(self.server.requests), 2)
+        path, payload = min(
+            self.server.requests, key=lambda request: request[1]["chat_id"]
+        )
+        self.assertEqual(path, "/bottoken/sendMessage")
+        self.assertEqual(payload, {"chat_id": ["1"], "text": ["first\n\nsecond"]})
+        self.assertFalse(
+            Notification.objects.exclude(
+                status=Notification.StatusChoices.SENT
+            ).exists()
+        )
+
+    def test_long_batches_are_split_at_telegram_limit(self):
+        for _ in range(3):
+            Notification.objects.create(chat_id="1", text="x" * 2000)
+
+        deliver_pending_notifications()
+
+        texts = [payload["text"][0] for _, payload in self.server.requests]
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(all(len(text) <= 4096 for text in texts))
+
+    def test_rate_limit_defers_without_counting_attempt(self):
+        notification = Notification.objects.create(chat_id="1", text="hello")
+        self.server.responses.append(
+            (429, {"ok": False, "parameters": {"retry_after": 42}})
+        )
+
+        retry_in = deliver_pending_notifications()
+
+        notification.refresh_from_db()
+        self.assertEqual(retry_in, 42)
+        self.assertEqual(notification.status, Notification.StatusChoices.PENDING)
+        self.assertEqual(notification.attempts, 0)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        notification = Notification.objects.create(chat_id="1", text="hello")
+        self.server.responses.append((500, {"ok": False, "description": "boom"}))
+
+        with override_settings(NOTIFICATION_RETRY_BACKOFF=10):
+            retry_in = deliver_pending_notifications()
+
+        notification.refresh_from_db()
+        self.assertEqual(retry_in, 10)
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(notification.last_error, "boom")
+        self.assertEqual(deliver_pending_notifications(), None)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_notification_fails_after_max_attempts(self):
+        notification = Notification.objects.create(
+            chat_id="1", text="hello", attempts=4
+        )
+        self.server.responses.append((500, {"ok": False, "description": "boom"}))
+
+        with override_settings(NOTIFICATION_MAX_ATTEMPTS=5):
+            retry_in = deliver_pending_notifications()
+
+        notification.refresh_from_db()
+        self.assertIsNone(retry_in)
+        self.assertEqual(notification.status, Notification.StatusChoices.FAILED)
+
+    def test_one_http_client_serves_every_chat(self):
+        Notification.objects.create(chat_id="1", text="first")
+        Notification.objects.create(chat_id="2", text="second")
+        clients = []
+
+        async def send(client, text, chat_id=None):
+            clients.append(client)
+
+        with patch("borrowings.notifications.asend_telegram_message", send):
+            deliver_pending_notifications()
+
+        self.assertEqual(len(clients), 2)
+        self.assertIs(clients[0], clients[1])
+
+
+class NotificationClaimTest(TransactionTestCase):
+    def test_messages_are_sent_outside_the_claim_transaction(self):
+        notification = Notification.objects.create(chat_id="1", text="hello")
+        during_send = []
+
+        def claim_state():
+            claimed = Notification.objects.get(pk=notification.pk)
+            return connection.in_atomic_block, claimed.next_attempt_at
+
+        async def send(client, text, chat_id=None):
+            during_send.append(await sync_to_async(claim_state)())
+
+        with patch("borrowings.notifications.asend_telegram_message", send):
+            deliver_pending_notifications()
+
+        [(in_transaction, next_attempt_at)] = during_send
+        self.assertFalse(in_transaction)
+        self.assertGreater(next_attempt_at, timezone.now())
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.StatusChoices.SENT)
+
+    def test_claim_expires_when_its_worker_dies(self):
+        notification = Notification.objects.create(chat_id="1", text="hello")
+        concurrent = []
+
+        async def crash(client, text, chat_id=None):
+            concurrent.append(await sync_to_async(deliver_pending_notifications)())
+            raise RuntimeError("worker died")
+
+        async def send(client, text, chat_id=None):
+            pass
+
+        with patch("borrowings.notifications.asend_telegram_message", crash):
+            with self.assertRaises(RuntimeError):
+                deliver_pending_notifications()
+        self.assertEqual(concurrent, [None])
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        with patch("borrowings.notifications.asend_telegram_message", send):
+            deliver_pending_notifications()
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.StatusChoices.SENT)
+
+
+class BeatScheduleTest(TestCase):
+    def test_sweeps_are_scheduled(self):
+        # What the database scheduler does with the schedule on startup.
+        for name, entry in celery_app.conf.beat_schedule.items():
+            ModelEntry.from_entry(name, app=celery_app, **entry)
+
+        self.assertEqual(
+            dict(
+                PeriodicTask.objects.filter(interval__isnull=False).values_list(
+                    "task", "interval__every"
+                )
+            ),
+            {
+                "borrowings.tasks.deliver_notifications": 60,
+                "borrowings.tasks.relay_events": 60,
+                "borrowings.tasks.expire_reservations": 300,
+            },
+        )
+
+
+@patch("borrowings.tasks.schedule_delivery")
+class OverdueBorrowingsTaskTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.book = sample_book()
+
+    def overdue_borrowing(self, days):
+        borrowing = sample_borrowing(user=self.user, book=self.book)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            expected_return_date=date.today() - timedelta(days=days)
+        )
+        return borrowing
+
+    def test_overdue_borrowings_are_sent_as_digest(self, mock_schedule):
+        overdue = [self.overdue_borrowing(days) for days in (1, 2, 3)]
+        sample_borrowing(user=self.user, book=self.book)
+        sample_borrowing(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() - timedelta(days=5),
+            actual_return_date=date.today(),
+        )
+
+        with self.assertNumQueries(2):
+            check_overdue_borrowings()
+
+        notification = Notification.objects.get()
+        for borrowing in overdue:
+            self.assertIn(f"borrowing id - {borrowing.id}.", notification.text)
+        self.assertIn("Borrowed by user@test.com.", notification.text)
+        self.assertIn("Overdue: 3 days.", notification.text)
+        self.assertIn("Fine so far: 35.94.", notification.text)
+        self.assertEqual(notification.text.count("Overdue borrowing:"), 3)
+
+    def test_query_count_does_not_depend_on_overdue_rows(self, mock_schedule):
+        for days in range(1, 40):
+            self.overdue_borrowing(days)
+
+        with override_settings(OVERDUE_CHUNK_SIZE=10, OVERDUE_DIGESTS_PER_FLUSH=1):
+            with self.assertNumQueries(3):
+                check_overdue_borrowings()
+
+        texts = Notification.objects.values_list("text", flat=True)
+        self.assertEqual(sum(text.count("Overdue borrowing:") for text in texts), 39)
+        self.assertTrue(all(len(text) <= 4096 for text in texts))
+
+    def test_no_overdue_borrowings(self, mock_schedule):
+        sample_borrowing(user=self.user, book=self.book)
+
+        check_overdue_borrowings()
+
+        self.assertEqual(
+            Notification.objects.get().text, "No borrowings overdue today!"
+        )
+
+    @patch("borrowings.tasks.group")
+    def test_fan_out_scans_id_ranges(self, mock_group, mock_schedule):
+        overdue = [self.overdue_borrowing(days) for days in (1, 2, 3, 4, 5)]
+
+        with override_settings(OVERDUE_RANGE_SIZE=2):
+            check_overdue_borrowings(fan_out=True)
+
+        subtasks = list(mock_group.call_args.args[0])
+        self.assertEqual(len(subtasks), 3)
+        self.assertEqual(subtasks[0].args[0], overdue[0].id)
+        self.assertEqual(subtasks[-1].args[1], overdue[-1].id)
+
+        found = sum(subtask.apply().get() for subtask in subtasks)
+        self.assertEqual(found, 5)
+        texts = "".join(Notification.objects.values_list("text", flat=True))
+        for borrowing in overdue:
+            self.assertIn(f"borrowing id - {borrowing.id}.", texts)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs row locking.")
+class InventoryConcurrencyTest(TransactionTestCase):
+    threads = 20
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"reader{i}@test.com", password="testpass"
+            )
+            for i in range(self.threads)
+        ]
+        self.book = sample_book(inventory=5)
+
+    def run_concurrently(self, func, args):
+        barrier = threading.Barrier(len(args))
+        results = []
+
+        def worker(arg):
+            try:
+                barrier.wait()
+                results.append(func(arg))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(arg,)) for arg in args]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    @patch("borrowings.events.schedule_relay")
+    def test_concurrent_borrow_and_return_keep_inventory_consistent(self, _):
+        def borrow(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            payload = {
+                "book": self.book.id,
+                "expected_return_date": date.today() + timedelta(days=7),
+            }
+            return client.post(BORROWING_URL, payload).status_code
+
+        statuses = self.run_concurrently(borrow, self.users)
+
+        self.book.refresh_from_db()
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 5)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), 15)
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.count(), 5)
+
+        def return_book(borrowing):
+            try:
+                borrowing.return_book()
+                return True
+            except ValueError:
+                return False
+
+        # Every borrowing is returned by four racing requests at once.
+        borrowings = list(Borrowing.objects.all()) * 4
+        results = self.run_concurrently(
+            return_book, [Borrowing.objects.get(pk=b.pk) for b in borrowings]
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(self.book.inventory, 5)
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+
+
+class BorrowingQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.admin_user = get_user_model().objects.create_user(
+            email="admin@test.com", password="adminpass", is_staff=True
+        )
+        book = sample_book()
+        for _ in range(6):
+            sample_borrowing(user=self.user, book=book)
+            sample_borrowing(user=self.admin_user)
+
+    def test_list_borrowings_query_budget(self):
+        self.client.force_authenticate(self.user)
+
+        with query_budget(2):
+            response = self.client.get(BORROWING_URL, {"is_active": "true"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_staff_list_borrowings_query_budget(self):
+        self.client.force_authenticate(self.admin_user)
+
+        with query_budget(2):
+            response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with query_budget(2):
+            response = self.client.get(BORROWING_URL, {"user_id": self.user.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_borrowing_query_budget(self):
+        self.client.force_authenticate(self.user)
+        borrowing = Borrowing.objects.filter(user=self.user).first()
+
+        with query_budget(1):
+            response = self.client.get(detail_url(borrowing.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BorrowingPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        book = sample_book()
+        self.borrowings = [
+            sample_borrowing(user=self.user, book=book) for _ in range(12)
+        ]
+        for days, borrowing in enumerate(self.borrowings[:4]):
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                borrow_date=date.today() - timedelta(days=days + 1)
+            )
+
+    def test_pages_follow_borrow_date_and_id_order(self):
+        expected = list(
+            Borrowing.objects.filter(user=self.user)
+            .order_by("-borrow_date", "-id")
+            .values_list("id", flat=True)
+        )
+
+        response = self.client.get(BORROWING_URL, {"count": "false"})
+        seen = []
+        while True:
+            self.assertLessEqual(len(response.data["results"]), 5)
+            seen += [borrowing["id"] for borrowing in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(seen, expected)
+
+    def test_filters_are_kept_between_pages(self):
+        Borrowing.objects.filter(pk__in=[b.pk for b in self.borrowings[:3]]).update(
+            actual_return_date=date.today()
+        )
+
+        response = self.client.get(BORROWING_URL, {"is_active": "true"})
+        response = self.client.get(response.data["next"])
+
+        self.assertEqual(response.data["count"], 9)
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertIsNone(response.data["next"])
+
+    def test_cursor_values_are_type_checked(self):
+        for values in (["yesterday", 1], ["2026-01-01", "one"], ["2026-02-30", 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps({"v": values}).encode())
+
+            response = self.client.get(BORROWING_URL, {"cursor": cursor.decode()})
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkBorrowingApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.expected_return_date = date.today() + timedelta(days=14)
+
+    def bulk_borrow(self, books):
+        return self.client.post(
+            BULK_URL,
+            {"books": books, "expected_return_date": self.expected_return_date},
+            format="json",
+        )
+
+    def test_bulk_borrow(self):
+        book1 = sample_book(inventory=5)
+        book2 = sample_book(inventory=1)
+        book3 = sample_book(inventory=0)
+
+        response = self.bulk_borrow([book1.id, book2.id, book2.id, book3.id, 999999])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "created", "failed", "failed", "failed"],
+        )
+        self.assertEqual(results[2]["error"], "This book is out of stock.")
+        self.assertEqual(results[4]["error"], "Book not found.")
+
+        borrowings = Borrowing.objects.filter(user=self.user)
+        self.assertEqual(
+            set(borrowings.values_list("id", flat=True)),
+            {results[0]["id"], results[1]["id"]},
+        )
+        book1.refresh_from_db()
+        book2.refresh_from_db()
+        self.assertEqual((book1.inventory, book2.inventory), (4, 0))
+        relay_pending_events()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_bulk_borrow_several_copies(self):
+        book = sample_book(inventory=3)
+
+        response = self.bulk_borrow([book.id] * 4)
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created", "created", "created", "failed"],
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_bulk_borrow_nothing_available(self):
+        book = sample_book(inventory=0)
+
+        response = self.bulk_borrow([book.id])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+
+    def test_bulk_borrow_invalid_payload(self):
+        response = self.bulk_borrow([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            BULK_URL,
+            {
+                "books": [sample_book().id],
+                "expected_return_date": date.today() - timedelta(days=1),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_borrow_query_count_is_constant(self):
+        books = [sample_book(inventory=i % 3 + 1) for i in range(12)]
+        book_ids = [book.id for book in books for _ in range(2)]
+
+        with query_budget(12):
+            response = self.bulk_borrow(book_ids)
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertTrue(mock_send.called)
+
+    def test_bulk_return(self):
+        book = sample_book(inventory=5)
+        open_borrowings = [
+            sample_borrowing(user=self.user, book=book) for _ in range(3)
+        ]
+        returned = sample_borrowing(
+            user=self.user, book=book, actual_return_date=date.today()
+        )
+        other = sample_borrowing(book=book)
+        ids = [b.id for b in open_borrowings] + [open_borrowings[0].id]
+
+        with query_budget(8):
+            response = self.client.post(
+                BULK_RETURN_URL,
+                {"borrowings": ids + [returned.id, other.id]},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["returned"] * 3 + ["failed"] * 3,
+        )
+        self.assertEqual(response.data["results"][-1]["error"], "Not found.")
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 8)
+        self.assertFalse(
+            Borrowing.objects.filter(
+                user=self.user, actual_return_date__isnull=True
+            ).exists()
+        )
+        other.refresh_from_db()
+        self.assertIsNone(other.actual_return_date)
+
+    def test_bulk_return_nothing_returned(self):
+        returned = sample_borrowing(user=self.user, actual_return_date=date.today())
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [returned.id]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExplainHotQueriesTest(TestCase):
+    @skipUnless(connection.vendor == "postgresql", "Checks PostgreSQL plans.")
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+
+        call_command("explain_hot_queries", seed=20000, stdout=out)
+
+        self.assertNotIn("FAIL", out.getvalue())
+        self.assertIn("user active borrowings page: borrowing_", out.getvalue())
+        self.assertIn("OK    staff borrowings page after cursor", out.getvalue())
+        self.assertIn(
+            "user borrowings delta page: borrowing_user_updated_idx", out.getvalue()
+        )
+        self.assertFalse(Borrowing.objects.exists())
+
+    @skipUnless(connection.vendor != "postgresql", "Runs on other databases.")
+    def test_other_databases_are_rejected(self):
+        with self.assertRaisesMessage(CommandError, "PostgreSQL"):
+            call_command("explain_hot_queries")
+
+
+class BenchmarkTest(TestCase):
+    def test_percentile(self):
+        samples = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+        self.assertEqual(percentile(samples, 50), 3.0)
+        self.assertAlmostEqual(percentile(samples, 95), 4.8)
+        self.assertEqual(percentile(samples, 100), 5.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_seed_library(self):
+        out = StringIO()
+
+        call_command(
+            "seed_library", users=5, books=20, borrowings=200, seed=1, stdout=out
+        )
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(Book.objects.count(), 20)
+        self.assertEqual(Borrowing.objects.count(), 200)
+        self.assertTrue(Borrowing.objects.filter(actual_return_date=None).exists())
+        self.assertFalse(
+            Borrowing.objects.filter(expected_return_date__lt=F("borrow_date")).exists()
+        )
+        self.assertGreater(
+            Borrowing.objects.values("borrow_date").distinct().count(), 100
+        )
+        copies = Book.objects.annotate(
+            copies=F("inventory")
+            + Count("borrowings", filter=Q(borrowings__actual_return_date=None))
+        ).values_list("copies", flat=True)
+        self.assertTrue(all(1 <= count <= 10 for count in copies))
+
+    @patch("borrowings.tasks.schedule_delivery")
+    def test_run_benchmark(self, schedule_delivery):
+        reader = get_user_model().objects.create_user(
+            email="reader@test.com", password="testpass"
+        )
+        book = sample_book(inventory=3)
+        sample_borrowing(expected_return_date=date.today() - timedelta(days=1))
+
+        with throttling_disabled():
+            scenarios = run_benchmark(reader, requests_per_scenario=4)
+
+        self.assertEqual(
+            list(scenarios),
+            [
+                "books_list",
+                "borrowings_list",
+                "borrowing_create",
+                "borrowing_return",
+                "overdue_task",
+            ],
+        )
+        for name, result in scenarios.items():
+            self.assertEqual(result["errors"], 0, name)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertEqual(scenarios["borrowing_return"]["requests"], 4)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 3)
+        self.assertFalse(Notification.objects.filter(text__contains="Overdue").exists())
+
+    def test_run_connection_benchmark(self):
+        scenarios = run_connection_benchmark(queries=3)
+
+        self.assertEqual(
+            list(scenarios), ["connection_per_request", "persistent_connection"]
+        )
+        for name, result in scenarios.items():
+            self.assertEqual(result["requests"], 3, name)
+            self.assertEqual(result["errors"], 0, name)
+
+    def test_run_serializer_benchmark(self):
+        sample_borrowing(actual_return_date=date.today(), fee=Decimal("5.99"))
+        sample_borrowing()
+
+        scenarios = run_serializer_benchmark(runs=2, rows=10)
+
+        self.assertEqual(
+            list(scenarios),
+            ["books_drf", "books_fast", "borrowings_drf", "borrowings_fast"],
+        )
+        for name, result in scenarios.items():
+            self.assertEqual(result["requests"], 2, name)
+            self.assertEqual(result["errors"], 0, name)
+
+    def test_slow_clients_hold_connections(self):
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            server.settimeout(5)
+            port = server.getsockname()[1]
+            with slow_clients(f"http://127.0.0.1:{port}", 2, interval=0.05):
+                connections = [server.accept()[0] for _ in range(2)]
+                received = [conn.recv(1024) for conn in connections]
+            for conn in connections:
+                conn.close()
+
+        for data in received:
+            self.assertTrue(data.startswith(b"GET /api/books/ HTTP/1.1\r\n"))
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_request_latency_per_route(self):
+        labels = {"route": "borrowings", "method": "GET", "status": "200"}
+        before = (
+            REGISTRY.get_sample_value("http_request_duration_seconds_count", labels)
+            or 0
+        )
+
+        self.client.get(BORROWING_URL)
+
+        self.assertEqual(
+            REGISTRY.get_sample_value("http_request_duration_seconds_count", labels),
+            before + 1,
+        )
+
+    def test_borrowing_gauges_are_cached(self):
+        sample_borrowing(user=self.user)
+        sample_borrowing(
+            user=self.user, expected_return_date=date.today() - timedelta(days=1)
+        )
+        sample_borrowing(user=self.user, actual_return_date=date.today())
+
+        response = self.client.get(reverse("metrics"))
+        sample_borrowing(user=self.user)
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b"borrowings_open 2.0", response.content)
+        self.assertIn(b"borrowings_overdue 1.0", response.content)
+        self.assertIn(b"borrowings_open 2.0", cached.content)
+
+    @patch("borrowings.tasks.schedule_delivery")
+    def test_task_duration_and_failures(self, schedule_delivery):
+        task = "borrowings.tasks.check_overdue_borrowings"
+        success = {"task": task, "state": "SUCCESS"}
+        runs = REGISTRY.get_sample_value("celery_task_duration_seconds_count", success)
+        failures = REGISTRY.get_sample_value(
+            "celery_task_failures_total", {"task": task}
+        )
+
+        check_overdue_borrowings.apply()
+        with patch("borrowings.tasks.scan_overdue", side_effect=RuntimeError):
+            sample_borrowing(expected_return_date=date.today() - timedelta(days=1))
+            check_overdue_borrowings.apply()
+
+        self.assertEqual(
+            REGISTRY.get_sample_value("celery_task_duration_seconds_count", success),
+            (runs or 0) + 1,
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value("celery_task_failures_total", {"task": task}),
+            (failures or 0) + 1,
+        )
+
+
+class AsyncBorrowingViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.own = sample_borrowing(user=self.user)
+        self.other = sample_borrowing()
+        with override_settings(ASYNC_VIEWS=True):
+            self.list_view = BorrowingViewSet.as_view({"get": "list"})
+            self.detail_view = BorrowingViewSet.as_view({"get": "retrieve"})
+
+    def get(self, view, path, **kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, self.user)
+        return view(request, **kwargs)
+
+    async def test_list_only_own_borrowings(self):
+        response = await self.get(self.list_view, BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [borrowing["id"] for borrowing in response.data["results"]], [self.own.id]
+        )
+        self.assertEqual(response.data["results"][0]["book"]["id"], self.own.book_id)
+
+    async def test_auth_required(self):
+        request = APIRequestFactory().get(BORROWING_URL)
+
+        response = await self.list_view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_retrieve_other_users_borrowing(self):
+        response = await self.get(
+            self.detail_view, detail_url(self.other.id), pk=self.other.id
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BorrowingThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+
+    def borrow(self):
+        return self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+
+    def test_take_token(self):
+        self.assertEqual(take_token(2, 100, 100, 2, 1), (True, 0, 1))
+        self.assertEqual(take_token(0, 100, 100.5, 2, 1), (False, 0.5, 0.5))
+        self.assertEqual(take_token(0, 100, 200, 2, 1), (True, 0, 1))
+
+    @patch.dict(ScopedRateThrottle.THROTTLE_RATES, {"borrow": "2/hour"})
+    def test_borrow_scope(self):
+        responses = [self.borrow() for _ in range(3)]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [
+                status.HTTP_201_CREATED,
+                status.HTTP_201_CREATED,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+        self.assertAlmostEqual(int(responses[2]["Retry-After"]), 1800, delta=1)
+        self.assertEqual(self.client.get(BORROWING_URL).status_code, 200)
+
+    @patch.dict(ScopedRateThrottle.THROTTLE_RATES, {"borrow": "1/hour"})
+    @patch("library_service.throttling.get_buckets")
+    def test_lets_requests_through_without_redis(self, get_buckets):
+        get_buckets.return_value.consume.side_effect = redis.ConnectionError()
+
+        with self.assertLogs("library_service.throttling", "WARNING"):
+            responses = [self.borrow() for _ in range(2)]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_201_CREATED, status.HTTP_201_CREATED],
+        )
+
+
+class RedisTokenBucketsTest(SimpleTestCase):
+    """Runs ``TOKEN_BUCKET_SCRIPT`` on fakeredis' Lua interpreter."""
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        # fakeredis answers Redis' TIME from time.time().
+        clock = patch("time.time", return_value=1000.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+
+    def buckets(self):
+        client = fakeredis.FakeRedis(server=self.server)
+        with patch("redis.Redis.from_url", return_value=client):
+            return RedisTokenBuckets("redis://redis:6379/2")
+
+    def test_burst_up_to_capacity(self):
+        buckets = self.buckets()
+
+        results = [buckets.consume("bucket", 3, 1) for _ in range(4)]
+
+        self.assertEqual(results, [(True, 0.0), (True, 0.0), (True, 0.0), (False, 1.0)])
+        self.assertEqual(buckets.client.pttl("bucket"), 3000)
+
+    def test_refill(self):
+        buckets = self.buckets()
+        for _ in range(2):
+            buckets.consume("bucket", 2, 4)
+
+        self.clock.return_value = 1000.125
+        self.assertEqual(buckets.consume("bucket", 2, 4), (False, 0.125))
+        self.clock.return_value = 1000.25
+        self.assertEqual(buckets.consume("bucket", 2, 4), (True, 0.0))
+        self.assertEqual(buckets.consume("bucket", 2, 4), (False, 0.25))
+
+    def test_refill_stops_at_capacity(self):
+        buckets = self.buckets()
+        buckets.consume("bucket", 2, 1)
+
+        self.clock.return_value = 2000.0
+        results = [buckets.consume("bucket", 2, 1) for _ in range(3)]
+
+        self.assertEqual([allowed for allowed, _ in results], [True, True, False])
+
+    def test_concurrent_clients_share_the_bucket(self):
+        clients = [self.buckets() for _ in range(20)]
+        results = []
+
+        def consume(buckets):
+            for _ in range(5):
+                results.append(buckets.consume("bucket", 30, 1)[0])
+
+        threads = [
+            threading.Thread(target=consume, args=(buckets,)) for buckets in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 30)
+        self.assertEqual(len(results), 100)
+
+
+class BookStatsCountersTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+        self.other_book = sample_book()
+
+    def stats(self, book):
+        stats = BookStats.objects.get(book=book)
+        return (
+            stats.active_loans,
+            stats.total_loans,
+            stats.returned_loans,
+            stats.late_returns,
+            stats.loan_days,
+        )
+
+    def test_counters_follow_borrows_and_returns(self):
+        for _ in range(2):
+            self.client.post(
+                BORROWING_URL,
+                {
+                    "book": self.book.id,
+                    "expected_return_date": date.today() + timedelta(days=7),
+                },
+            )
+        self.client.post(
+            BULK_URL,
+            {
+                "books": [self.book.id, self.other_book.id, self.other_book.id],
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+            format="json",
+        )
+        borrowings = list(Borrowing.objects.order_by("id"))
+        Borrowing.objects.filter(pk=borrowings[0].pk).update(
+            borrow_date=date.today() - timedelta(days=10),
+            expected_return_date=date.today() - timedelta(days=3),
+        )
+
+        self.client.post(
+            reverse("borrowings:borrowing-return-borrowing", args=[borrowings[0].id])
+        )
+        self.client.post(
+            BULK_RETURN_URL,
+            {"borrowings": [borrowings[1].id, borrowings[3].id]},
+            format="json",
+        )
+        relay_pending_events()
+
+        self.assertEqual(self.stats(self.book), (1, 3, 2, 1, 10))
+        self.assertEqual(self.stats(self.other_book), (1, 2, 1, 0, 0))
+
+        counted = {book: self.stats(book) for book in (self.book, self.other_book)}
+        recompute_book_stats()
+        self.assertEqual(
+            {book: self.stats(book) for book in (self.book, self.other_book)},
+            counted,
+        )
+
+    def test_recompute_marks_counted_stats_events_processed(self):
+        self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+        event = OutboxEvent.objects.get(
+            consumer="stats", status=OutboxEvent.StatusChoices.PENDING
+        )
+
+        recompute_book_stats()
+        relay_pending_events()
+
+        self.assertEqual(self.stats(self.book), (1, 1, 0, 0, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.StatusChoices.PROCESSED)
+        self.assertIsNotNone(event.processed_at)
+
+
+class BorrowingFeesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(daily_fee=Decimal("2.50"))
+        self.today = date.today()
+
+    def loan(self, borrowed_days_ago, due_days_ago, returned_days_ago=None):
+        borrowing = sample_borrowing(user=self.user, book=self.book)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=self.today - timedelta(days=borrowed_days_ago),
+            expected_return_date=self.today - timedelta(days=due_days_ago),
+            actual_return_date=(
+                None
+                if returned_days_ago is None
+                else self.today - timedelta(days=returned_days_ago)
+            ),
+        )
+        return borrowing
+
+    def test_calculate_fees(self):
+        fee = Decimal("2.50")
+        day = date(2026, 1, 10)
+        self.assertEqual(
+            calculate_fees(day, day + timedelta(days=7), day, fee),
+            (Decimal("2.50"), Decimal("0.00")),
+        )
+        self.assertEqual(
+            calculate_fees(day, day + timedelta(days=7), day + timedelta(days=5), fee),
+            (Decimal("12.50"), Decimal("0.00")),
+        )
+        self.assertEqual(
+            calculate_fees(day, day + timedelta(days=7), day + timedelta(days=10), fee),
+            (Decimal("25.00"), Decimal("15.00")),
+        )
+
+    def test_return_charges_fee_and_fine(self):
+        borrowing = self.loan(10, 3)
+
+        response = self.client.post(
+            reverse("borrowings:borrowing-return-borrowing", args=[borrowing.id])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.data["fee"], response.data["fine"]), ("25.00", "15.00")
+        )
+        borrowing.refresh_from_db()
+        self.assertEqual(
+            (borrowing.fee, borrowing.fine), (Decimal("25.00"), Decimal("15.00"))
+        )
+
+    def test_bulk_return_charges_each_loan(self):
+        late, on_time = self.loan(10, 3), self.loan(4, -3)
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [late.id, on_time.id]}, format="json"
+        )
+
+        self.assertEqual(
+            [(result["fee"], result["fine"]) for result in response.data["results"]],
+            [("25.00", "15.00"), ("10.00", "0.00")],
+        )
+        self.assertEqual(
+            list(Borrowing.objects.order_by("id").values_list("fee", "fine")),
+            [(Decimal("25.00"), Decimal("15.00")), (Decimal("10.00"), Decimal("0.00"))],
+        )
+
+    def test_annotated_fees_match_calculated_fees(self):
+        loans = [
+            self.loan(10, 3),
+            self.loan(4, -3),
+            self.loan(0, -7),
+            self.loan(30, 20, 5),
+        ]
+
+        with self.assertNumQueries(1):
+            annotated = list(
+                annotate_fees(
+                    Borrowing.objects.filter(pk__in=[loan.pk for loan in loans]),
+                    self.today,
+                ).order_by("id")
+            )
+
+        for borrowing in annotated:
+            self.assertEqual(
+                (borrowing.accrued_fee, borrowing.accrued_fine),
+                calculate_fees(
+                    borrowing.borrow_date,
+                    borrowing.expected_return_date,
+                    borrowing.actual_return_date or self.today,
+                    Decimal("2.50"),
+                ),
+            )
+
+    def test_billing_report(self):
+        self.loan(10, 3)
+        self.loan(4, -3)
+        yesterday = self.loan(20, 10)
+        self.client.post(
+            reverse("borrowings:borrowing-return-borrowing", args=[yesterday.id])
+        )
+        Borrowing.objects.filter(pk=yesterday.pk).update(
+            actual_return_date=self.today - timedelta(days=1)
+        )
+
+        with self.assertNumQueries(3):
+            send_billing_report()
+
+        self.assertEqual(
+            Notification.objects.get().text,
+            f"Billing report for {self.today - timedelta(days=1)}.\n"
+            "Returned: 1 borrowings, fees 50.00, fines 50.00.\n"
+            f"Open on {self.today}: 2 borrowings, 1 overdue, "
+            "accrued fees 35.00, accrued fines 15.00.",
+        )
+
+
+class BorrowingExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com", password="adminpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.open = [sample_borrowing(user=self.user) for _ in range(3)]
+        self.returned = sample_borrowing(
+            user=self.user, actual_return_date=date.today()
+        )
+        self.other = sample_borrowing()
+
+    def export(self, **params):
+        return self.client.get(EXPORT_URL, params)
+
+    def test_export_csv(self):
+        response = self.export(user_id=self.user.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="borrowings.csv"'
+        )
+        rows = list(csv.DictReader(StringIO(response.getvalue().decode())))
+        self.assertEqual(
+            [int(row["id"]) for row in rows],
+            [borrowing.id for borrowing in (*self.open, self.returned)],
+        )
+        self.assertEqual(rows[0]["user_email"], "user@test.com")
+        self.assertEqual(rows[0]["book_title"], self.open[0].book.title)
+        self.assertEqual(rows[0]["actual_return_date"], "")
+
+    def test_export_ndjson_with_is_active_filter(self):
+        response = self.export(export_format="ndjson", is_active="false")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in response.getvalue().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.returned.id])
+        self.assertEqual(rows[0]["actual_return_date"], date.today().isoformat())
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_export_streams_in_batches(self):
+        response = self.export()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            [len(chunk.splitlines()) for chunk in response.streaming_content],
+            [1, 2, 2, 1, 0],
+        )
+
+    def test_export_gzip(self):
+        response = self.client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        lines = gzip.decompress(response.getvalue()).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+    def test_export_async_under_asgi(self):
+        async def read(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        request = AsyncRequestFactory().get(EXPORT_URL, {"export_format": "ndjson"})
+        force_authenticate(request, self.admin)
+        response = BorrowingViewSet.as_view({"get": "export"})(request)
+
+        self.assertTrue(response.is_async)
+        lines = async_to_sync(read)(response).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_export_sync_under_wsgi(self):
+        response = self.export(export_format="ndjson")
+
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(response.getvalue().splitlines()), 5)
+
+    def test_invalid_format(self):
+        response = self.export(export_format="xml")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("export_format", response.data)
+
+    def test_export_staff_only(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.export()
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@patch("borrowings.tasks.expire_reservations.apply_async")
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"reader{number}@test.com", password="testpass"
+            )
+            for number in range(3)
+        ]
+        self.book = sample_book(inventory=0)
+        self.loan = sample_borrowing(user=self.users[2], book=self.book)
+
+    def reserve(self, user, book=None):
+        self.client.force_authenticate(user)
+        return self.client.post(RESERVATION_URL, {"book": (book or self.book).id})
+
+    def status_of(self, reservation_id):
+        return Reservation.objects.get(pk=reservation_id).status
+
+    def inventory(self):
+        return Book.objects.get(pk=self.book.pk).inventory
+
+    def return_loan(self):
+        self.client.force_authenticate(self.users[2])
+        with patch("borrowings.notifications.schedule_delivery"), patch(
+            "borrowings.events.schedule_relay"
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse(
+                        "borrowings:borrowing-return-borrowing", args=[self.loan.id]
+                    )
+                )
+
+    def test_reserve_out_of_stock_book(self, mock_expire):
+        response = self.reserve(self.users[0])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "WAITING")
+        self.assertEqual(
+            self.reserve(self.users[0]).data["book"],
+            ["You have already reserved this book."],
+        )
+
+    def test_reserve_book_in_stock(self, mock_expire):
+        response = self.reserve(self.users[0], sample_book(inventory=1))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["book"], ["This book is in stock, borrow it instead."]
+        )
+
+    def test_returned_copy_goes_to_first_in_line(self, mock_expire):
+        first = self.reserve(self.users[0]).data["id"]
+        second = self.reserve(self.users[1]).data["id"]
+        ready = []
+        reservation_ready.connect(
+            lambda reservations, **kwargs: ready.extend(reservations),
+            weak=False,
+            dispatch_uid="test_reservation_ready",
+        )
+        self.addCleanup(
+            reservation_ready.disconnect, dispatch_uid="test_reservation_ready"
+        )
+
+        self.return_loan()
+
+        self.assertEqual(self.status_of(first), "READY")
+        self.assertEqual(self.status_of(second), "WAITING")
+        self.assertEqual(self.inventory(), 0)
+        self.assertEqual([reservation.id for reservation in ready], [first])
+        self.assertIn("Reserved book is ready!", Notification.objects.latest("id").text)
+        mock_expire.assert_called_once_with(
+            eta=Reservation.objects.get(pk=first).expires_at
+        )
+
+    def test_only_the_ready_reservation_can_borrow(self, mock_expire):
+        first = self.reserve(self.users[0]).data["id"]
+        self.reserve(self.users[1])
+        self.return_loan()
+        payload = {
+            "book": self.book.id,
+            "expected_return_date": date.today() + timedelta(days=7),
+        }
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.post(BORROWING_URL, payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post(BORROWING_URL, payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.status_of(first), "FULFILLED")
+        self.assertEqual(self.inventory(), 0)
+
+    def test_unclaimed_copy_moves_down_the_line(self, mock_expire):
+        first = self.reserve(self.users[0]).data["id"]
+        second = self.reserve(self.users[1]).data["id"]
+        self.return_loan()
+        Reservation.objects.filter(pk=first).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        expire_reservations()
+
+        self.assertEqual(self.status_of(first), "EXPIRED")
+        self.assertEqual(self.status_of(second), "READY")
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.post(
+            reverse("borrowings:reservation-cancel", args=[second])
+        )
+        self.assertEqual(response.data["status"], "CANCELLED")
+        self.assertEqual(self.inventory(), 1)
+
+    def test_bulk_return_and_borrow(self, mock_expire):
+        first = self.reserve(self.users[0]).data["id"]
+        self.client.force_authenticate(self.users[2])
+        self.client.post(BULK_RETURN_URL, {"borrowings": [self.loan.id]}, format="json")
+        self.assertEqual(self.status_of(first), "READY")
+
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post(
+            BULK_URL,
+            {
+                "books": [self.book.id, self.book.id],
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+            format="json",
+        )
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created", "failed"],
+        )
+        self.assertEqual(self.status_of(first), "FULFILLED")
+        self.assertEqual(self.inventory(), 0)
+
+    def test_list_own_reservations(self, mock_expire):
+        own = self.reserve(self.users[0]).data["id"]
+        self.reserve(self.users[1])
+
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(RESERVATION_URL)
+
+        self.assertEqual(
+            [reservation["id"] for reservation in response.data["results"]], [own]
+        )
+
+
+class OutboxEventTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=1)
+
+    def borrow(self):
+        return self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+
+    def events(self, **filters):
+        return set(
+            OutboxEvent.objects.filter(**filters).values_list(
+                "event_type", "consumer", "status"
+            )
+        )
+
+    def test_events_are_written_with_the_borrowing(self):
+        self.borrow()
+
+        self.assertEqual(
+            self.events(),
+            {
+                ("BorrowingCreated", "notifications", "PENDING"),
+                ("BorrowingCreated", "stats", "PENDING"),
+                ("InventoryChanged", "cache", "PENDING"),
+            },
+        )
+        payload = OutboxEvent.objects.get(consumer="notifications").payload
+        self.assertEqual(payload["user_email"], "user@test.com")
+        self.assertEqual(
+            payload["expected_return_date"],
+            (date.today() + timedelta(days=7)).isoformat(),
+        )
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(BookStats.objects.get(book=self.book).active_loans, 0)
+
+    def test_rejected_borrowing_writes_no_events(self):
+        self.borrow()
+        OutboxEvent.objects.all().delete()
+
+        response = self.borrow()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_delivers_events_once(self):
+        self.borrow()
+        borrowing = Borrowing.objects.get()
+        self.client.post(
+            reverse("borrowings:borrowing-return-borrowing", args=[borrowing.id])
+        )
+
+        self.assertEqual(relay_pending_events(), (False, None))
+        relay_pending_events()
+
+        self.assertEqual(self.events(status="PENDING"), set())
+        self.assertIn(("BookReturned", "stats", "PROCESSED"), self.events())
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual((stats.total_loans, stats.returned_loans), (1, 1))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failing_consumer_is_retried_alone(self):
+        self.borrow()
+
+        with patch(
+            "borrowings.events.record_borrows", side_effect=RuntimeError("down")
+        ), self.assertLogs("borrowings.events", "ERROR"):
+            _, retry_in = relay_pending_events()
+
+        self.assertIsNotNone(retry_in)
+        failed = OutboxEvent.objects.get(consumer="stats")
+        self.assertEqual(
+            (failed.status, failed.attempts, failed.last_error), ("PENDING", 1, "down")
+        )
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(Notification.objects.count(), 1)
+
+        OutboxEvent.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        relay_pending_events()
+
+        self.assertEqual(self.events(status="PENDING"), set())
+        self.assertEqual(BookStats.objects.get(book=self.book).active_loans, 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @override_settings(EVENT_MAX_ATTEMPTS=1)
+    def test_consumer_gives_up_after_max_attempts(self):
+        self.borrow()
+
+        with patch(
+            "borrowings.events.record_borrows", side_effect=RuntimeError("down")
+        ), self.assertLogs("borrowings.events", "ERROR"):
+            relay_pending_events()
+
+        self.assertEqual(OutboxEvent.objects.get(consumer="stats").status, "FAILED")
+
+    @override_settings(EVENT_RELAY_BATCH_SIZE=2)
+    @patch("borrowings.tasks.relay_events.delay")
+    def test_relay_task_continues_full_batches(self, mock_delay):
+        self.borrow()
+
+        relay_events()
+
+        mock_delay.assert_called_once()
+        self.assertEqual(len(self.events(status="PENDING")), 1)
+
+
+class BorrowingFieldsetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.borrowing = sample_borrowing(user=self.user)
+
+    def test_sparse_list_skips_joins(self):
+        with query_budget(2) as queries:
+            response = self.client.get(
+                BORROWING_URL, {"fields": "id,expected_return_date"}
+            )
+
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": self.borrowing.id,
+                    "expected_return_date": str(self.borrowing.expected_return_date),
+                }
+            ],
+        )
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("JOIN", sql)
+        self.assertNotIn('"fee"', sql)
+
+    def test_relations_not_expanded_are_ids(self):
+        response = self.client.get(BORROWING_URL, {"expand": "book"})
+
+        borrowing = response.data["results"][0]
+        self.assertEqual(borrowing["user"], self.user.id)
+        self.assertEqual(borrowing["book"]["title"], self.borrowing.book.title)
+
+    def test_nested_fields(self):
+        with query_budget(2) as queries:
+            response = self.client.get(
+                detail_url(self.borrowing.id), {"fields": "id,book.title,user.email"}
+            )
+
+        self.assertEqual(
+            response.data,
+            {
+                "id": self.borrowing.id,
+                "book": {"title": self.borrowing.book.title},
+                "user": {"email": "user@test.com"},
+            },
+        )
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertNotIn('"author"', sql)
+        self.assertNotIn('"is_staff"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(
+            BORROWING_URL, {"fields": "id,book.isbn", "expand": "shelf"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["expand"], ["Unknown relation: shelf."])
+
+        response = self.client.get(BORROWING_URL, {"fields": "id,book.isbn"})
+        self.assertEqual(response.data["fields"], ["Unknown field: book.isbn."])
+
+    async def test_async_sparse_list(self):
+        with override_settings(ASYNC_VIEWS=True):
+            view = BorrowingViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get(
+            BORROWING_URL, {"fields": "id,book.title", "expand": ""}
+        )
+        force_authenticate(request, self.user)
+
+        response = await view(request)
+
+        self.assertEqual(
+            response.data["results"],
+            [{"id": self.borrowing.id, "book": {"title": self.borrowing.book.title}}],
+        )
+
+
+class FastListParityTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            email="staff@test.com", password="testpass", is_staff=True
+        )
+        self.client.force_authenticate(self.staff)
+        for _ in range(6):
+            sample_borrowing()
+        reader = get_user_model().objects.create_user(
+            email="reader@test.com",
+            password="testpass",
+            first_name="Zoë \u2028",
+            last_name='"Quote" \\ \t',
+        )
+        book = sample_book(title="Ünïcode \u2029 \x01 </script>", daily_fee="0.10")
+        sample_borrowing(user=reader, book=book)
+        sample_borrowing(
+            user=reader,
+            book=book,
+            expected_return_date=date.today() - timedelta(days=2),
+            actual_return_date=date.today(),
+            fee=Decimal("12.00"),
+            fine=Decimal("0.45"),
+        )
+
+    def assert_same_json(self, params):
+        with override_settings(FAST_LIST_VIEWS=False):
+            expected = self.client.get(BORROWING_URL, params)
+        response = self.client.get(BORROWING_URL, params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_list_renders_same_bytes(self):
+        response = self.assert_same_json({})
+
+        self.assertIn(b"\\u2028", response.content)
+        self.assertIn(b"\\u2029", response.content)
+        cursor = parse_qs(response.data["next"].split("?")[1])["cursor"][0]
+        self.assert_same_json({"cursor": cursor})
+        self.assert_same_json({"fields": "id,fee,book.title,user.last_name"})
+        self.assert_same_json({"expand": "book", "is_active": "false"})
+
+    def test_falls_back_for_other_renderers(self):
+        response = self.client.get(
+            BORROWING_URL, HTTP_ACCEPT="application/json; indent=2"
+        )
+
+        with override_settings(FAST_LIST_VIEWS=False):
+            expected = self.client.get(
+                BORROWING_URL, HTTP_ACCEPT="application/json; indent=2"
+            )
+        self.assertEqual(response.content, expected.content)
+
+        response = self.client.get(BORROWING_URL, {"fields": "isbn"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_list_renders_same_bytes(self):
+        with override_settings(ASYNC_VIEWS=True):
+            view = BorrowingViewSet.as_view({"get": "list"})
+
+        responses = []
+        for fast in (False, True):
+            request = APIRequestFactory().get(BORROWING_URL)
+            force_authenticate(request, self.staff)
+            with override_settings(FAST_LIST_VIEWS=fast):
+                response = await view(request)
+                responses.append(response.render().content)
+
+        self.assertEqual(responses[0], responses[1])
+
+
+@override_settings(DELTA_SYNC_OVERLAP=0)
+class BorrowingSyncTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+        self.borrowings = [
+            sample_borrowing(user=self.user, book=self.book) for _ in range(3)
+        ]
+        sample_borrowing()
+
+    def sync(self, since="", **params):
+        ids = []
+        response = self.client.get(BORROWING_URL, {"since": since, **params})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [borrowing["id"] for borrowing in response.data["results"]]
+            if not response.data["next"]:
+                return ids, response.data["since"]
+            response = self.client.get(response.data["next"])
+
+    def test_returns_move_the_watermark(self):
+        borrowing = self.borrowings[0]
+        before = borrowing.updated_at
+
+        self.client.post(detail_url(borrowing.id) + "return/")
+        self.client.post(BULK_RETURN_URL, {"borrowings": [self.borrowings[1].id]})
+
+        borrowing.refresh_from_db()
+        self.assertGreater(borrowing.updated_at, before)
+        self.assertGreater(
+            Borrowing.objects.get(pk=self.borrowings[1].id).updated_at, before
+        )
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get(BORROWING_URL, {"is_active": "true"})
+        etag = response["ETag"]
+
+        with query_budget(1):
+            response = self.client.get(
+                BORROWING_URL, {"is_active": "true"}, HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        self.client.post(detail_url(self.borrowings[0].id) + "return/")
+        response = self.client.get(
+            BORROWING_URL, {"is_active": "true"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_etag_depends_on_the_request(self):
+        etag = self.client.get(BORROWING_URL)["ETag"]
+
+        response = self.client.get(
+            BORROWING_URL, {"count": "false"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        other = get_user_model().objects.create_user(
+            email="other@test.com", password="testpass"
+        )
+        self.client.force_authenticate(other)
+        response = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_nested_book_changes_expire_the_etag(self):
+        nested = self.client.get(BORROWING_URL)["ETag"]
+        ids_only = self.client.get(BORROWING_URL, {"expand": ""})["ETag"]
+
+        self.book.author = "Another Author"
+        self.book.save()
+
+        response = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=nested)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(
+            BORROWING_URL, {"expand": ""}, HTTP_IF_NONE_MATCH=ids_only
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_is_not_modified(self):
+        url = detail_url(self.borrowings[0].id)
+        etag = self.client.get(url, {"fields": "id,user.email"})["ETag"]
+
+        with query_budget(1):
+            response = self.client.get(
+                url, {"fields": "id,user.email"}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user.email = "renamed@test.com"
+        self.user.save()
+        response = self.client.get(
+            url, {"fields": "id,user.email"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["email"], "renamed@test.com")
+
+    def test_delta_sync(self):
+        self.client.post(detail_url(self.borrowings[0].id) + "return/")
+
+        ids, since = self.sync(is_active="true")
+        self.assertEqual(ids, [b.id for b in self.borrowings[1:]])
+
+        ids, since = self.sync(since, is_active="true")
+        self.assertEqual(ids, [])
+
+        new = sample_borrowing(user=self.user, book=self.book)
+        self.client.post(detail_url(self.borrowings[1].id) + "return/")
+        response = self.client.get(BORROWING_URL, {"since": since, "is_active": "true"})
+
+        self.assertEqual(
+            [borrowing["id"] for borrowing in response.data["results"]],
+            [new.id, self.borrowings[1].id],
+        )
+        self.assertIsNotNone(response.data["results"][1]["actual_return_date"])
+        self.assertNotIn("count", response.data)
+
+    @patch.object(BorrowingSyncPagination, "page_size", 2)
+    def test_delta_sync_pages(self):
+        Borrowing.objects.filter(user=self.user).update(updated_at=timezone.now())
+
+        ids, since = self.sync()
+
+        self.assertEqual(sorted(ids), [b.id for b in self.borrowings])
+        self.assertEqual(self.sync(since)[0], [])
+
+    def test_recent_changes_are_sent_again(self):
+        with override_settings(DELTA_SYNC_OVERLAP=60):
+            ids, since = self.sync()
+            self.assertEqual(self.sync(since)[0], ids)
+
+    def test_invalid_since(self):
+        response = self.client.get(BORROWING_URL, {"since": "nope"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_not_modified(self):
+        with override_settings(ASYNC_VIEWS=True):
+            view = BorrowingViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get(BORROWING_URL, {"since": ""})
+        force_authenticate(request, self.user)
+        response = await view(request)
+
+        request = APIRequestFactory().get(
+            BORROWING_URL, {"since": ""}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        force_authenticate(request, self.user)
+        response = await view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BorrowingViewSet
+from .views import BorrowingViewSet, ReservationViewSet
 
 router = DefaultRouter()
+router.register("reservations", ReservationViewSet)
 router.register("", BorrowingViewSet)
 
 urlpatterns = [
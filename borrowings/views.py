@@ -1,28 +1,69 @@
 from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from .models import Borrowing
+from library_service.async_views import AsyncReadMixin
+from library_service.export import EXPORT_PARAMETERS, export_response
+from library_service.fastpath import FastListMixin
+from library_service.fieldsets import FIELDSET_PARAMETERS, SparseFieldsetViewMixin
+from django.db import transaction
+from .models import Borrowing, Reservation
+from .pagination import (
+    BorrowingPagination,
+    BorrowingSyncPagination,
+    ReservationPagination,
+)
+from .reservations import release_reservations
 from .serializers import (
     BorrowingSerializer,
     BorrowingCreateSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkCreateSerializer,
+    BorrowingBulkReturnSerializer,
+    ReservationSerializer,
 )
-from .telegram_helper import send_telegram_message
+from .sync import SINCE_QUERY_PARAM, BorrowingSyncMixin
+
+EXPORT_COLUMNS = {
+    "id": "id",
+    "borrow_date": "borrow_date",
+    "expected_return_date": "expected_return_date",
+    "actual_return_date": "actual_return_date",
+    "fee": "fee",
+    "fine": "fine",
+    "book_id": "book_id",
+    "book_title": "book__title",
+    "user_id": "user_id",
+    "user_email": "user__email",
+}
 
 
+@extend_schema_view(retrieve=extend_schema(parameters=FIELDSET_PARAMETERS))
 class BorrowingViewSet(
+    BorrowingSyncMixin,
+    SparseFieldsetViewMixin,
+    FastListMixin,
+    AsyncReadMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Borrowing.objects.all()
+    queryset = Borrowing.objects.select_related("book", "user")
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 5
+
+    @property
+    def pagination_class(self):
+        if self.is_delta_sync:
+            return BorrowingSyncPagination
+        return BorrowingPagination
+
+    @property
+    def throttle_scope(self):
+        if self.action in ("create", "bulk_create"):
+            return "borrow"
+        return None
 
     @extend_schema(
         parameters=[
@@ -38,6 +79,18 @@ class BorrowingViewSet(
                 location=OpenApiParameter.QUERY,
                 description="Filter borrowings by active status (true/false).",
             ),
+            OpenApiParameter(
+                name=SINCE_QUERY_PARAM,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=(
+                    "Delta sync: return only the borrowings changed after this "
+                    "cursor, oldest change first, with the since cursor to poll "
+                    "with next. Empty for a first full sync. With is_active=true, "
+                    "borrowings returned since the cursor are included."
+                ),
+            ),
+            *FIELDSET_PARAMETERS,
         ]
     )
     def list(self, request, *args, **kwargs):
@@ -46,32 +99,21 @@ class BorrowingViewSet(
     def get_serializer_class(self):
         if self.action == "create":
             return BorrowingCreateSerializer
+        if self.action == "bulk_create":
+            return BorrowingBulkCreateSerializer
+        if self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
         return BorrowingSerializer
 
     def perform_create(self, serializer):
-        book = serializer.validated_data["book"]
-        if book.inventory < 1:
-            return Response(
-                {"detail": "This book is out of stock."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        borrowing = serializer.save(user=self.request.user)
-
-        message = (
-            f"New borrowing created!\n"
-            f"Book title: {borrowing.book.title}\n"
-            f"User: {borrowing.user.email}\n"
-            f"Expected return date: {borrowing.expected_return_date}"
-        )
-        send_telegram_message(message)
+        serializer.save(user_id=self.request.user.id)
 
     def get_queryset(self):
         queryset = super().get_queryset()
         user = self.request.user
 
         if not user.is_staff:
-            queryset = queryset.filter(user=user)
+            queryset = queryset.filter(user_id=user.id)
 
         if user.is_staff:
             user_id = self.request.query_params.get("user_id")
@@ -81,11 +123,14 @@ class BorrowingViewSet(
         is_active = self.request.query_params.get("is_active")
         if is_active:
             if is_active.lower() == "true":
-                queryset = queryset.filter(actual_return_date__isnull=True)
+                # A delta keeps the borrowings returned since the cursor, so
+                # clients know to drop them.
+                if not self.request.query_params.get(SINCE_QUERY_PARAM):
+                    queryset = queryset.filter(actual_return_date__isnull=True)
             elif is_active.lower() == "false":
                 queryset = queryset.filter(actual_return_date__isnull=False)
 
-        return queryset.distinct()
+        return queryset
 
     @extend_schema(
         methods=["POST"],
@@ -98,8 +143,121 @@ class BorrowingViewSet(
         serializer = BorrowingReturnSerializer(borrowing, data={})
 
         if serializer.is_valid():
-            serializer.save()
+            borrowing = serializer.save()
             return Response(
-                {"status": "Book returned successfully."}, status=status.HTTP_200_OK
+                {
+                    "status": "Book returned successfully.",
+                    "fee": str(borrowing.fee),
+                    "fine": str(borrowing.fine),
+                },
+                status=status.HTTP_200_OK,
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        methods=["POST"],
+        description="Borrow several books at once. Returns a result per book.",
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save(user=request.user)
+
+        created = any(result["status"] == "created" for result in results)
+        return Response(
+            {"results": results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @extend_schema(
+        methods=["POST"],
+        description=(
+            "Return several borrowed books at once. Returns a result per borrowing."
+        ),
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-return")
+    def bulk_return(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save(queryset=self.get_queryset())
+
+        returned = any(result["status"] == "returned" for result in results)
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if returned else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @extend_schema(
+        description=(
+            "Stream the borrowing history as CSV or NDJSON (staff only). "
+            "Accepts the user_id and is_active filters."
+        ),
+        parameters=EXPORT_PARAMETERS,
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        return export_response(
+            request, self.get_queryset().order_by("id"), EXPORT_COLUMNS, "borrowings"
+        )
+
+
+class ReservationViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Waitlist places for books that are out of stock.
+
+    When a copy comes back, the oldest waiting reservation gets it and a
+    notification goes out; borrowing the book claims it before it expires.
+    """
+
+    queryset = Reservation.objects.all()
+    serializer_class = ReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReservationPagination
+
+    @property
+    def throttle_scope(self):
+        if self.action == "create":
+            return "borrow"
+        return None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user_id=self.request.user.id)
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user_id=self.request.user.id)
+
+    @extend_schema(
+        methods=["POST"],
+        description="Leave the waitlist, or give up a copy held for you.",
+        request=None,
+        responses=ReservationSerializer,
+    )
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        reservation = self.get_object()
+        with transaction.atomic():
+            current = (
+                Reservation.objects.select_for_update()
+                .values_list("id", "book_id", "status")
+                .get(pk=reservation.pk)
+            )
+            if current[2] not in (
+                Reservation.StatusChoices.WAITING,
+                Reservation.StatusChoices.READY,
+            ):
+                return Response(
+                    {"status": f"Reservation is already {current[2].lower()}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            release_reservations([current], Reservation.StatusChoices.CANCELLED)
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
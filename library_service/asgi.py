@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_service.settings')
+# Serve book and borrowing reads with the async views under ASGI.
+os.environ.setdefault('ASYNC_VIEWS', 'true')
+# Requests don't reuse threads under ASGI, so persistent connections would
+# pile up; use DB_POOL for reuse here instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
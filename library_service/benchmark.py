@@ -0,0 +1,340 @@
+import json
+import math
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import Client
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from books.serializers import BookSerializer
+from borrowings.models import Borrowing
+from borrowings.serializers import BorrowingSerializer
+from borrowings.tasks import check_overdue_borrowings
+from library_service.fastpath import compile_serializer
+from library_service.renderers import ORJSONRenderer
+from user.authentication import add_user_claims
+
+HTTP_TIMEOUT = 10
+
+
+def percentile(samples, pct):
+    """Linearly interpolated percentile of an already sorted list."""
+    if not samples:
+        return None
+    position = (len(samples) - 1) * pct / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+
+def summarize(durations, errors, elapsed):
+    """Latency percentiles in milliseconds and throughput of one scenario."""
+    samples = sorted(duration * 1000 for duration in durations)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "mean_ms": sum(samples) / len(samples) if samples else None,
+        "rps": len(samples) / elapsed if elapsed else None,
+    }
+
+
+@contextmanager
+def throttling_disabled():
+    """Switch off DRF throttling for the in-process benchmark."""
+    throttle_classes = APIView.throttle_classes
+    APIView.throttle_classes = ()
+    try:
+        yield
+    finally:
+        APIView.throttle_classes = throttle_classes
+
+
+class BenchmarkClient:
+    """Send authenticated API requests through Django's test client or HTTP.
+
+    Without ``base_url`` requests go through the full middleware and view
+    stack in this process; with it they go over HTTP to a running server,
+    e.g. a local gunicorn. Each thread gets its own client.
+    """
+
+    def __init__(self, user, base_url=None):
+        header = settings.SIMPLE_JWT.get("AUTH_HEADER_NAME", "HTTP_AUTHORIZATION")
+        header = header.removeprefix("HTTP_").replace("_", "-").title()
+        token = add_user_claims(AccessToken.for_user(user), user)
+        self.headers = {header: f"Bearer {token}"}
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.local = threading.local()
+
+    def request(self, method, path, payload=None):
+        """Return the status code and decoded JSON body of one request."""
+        if self.base_url:
+            if not hasattr(self.local, "session"):
+                self.local.session = requests.Session()
+            response = self.local.session.request(
+                method,
+                f"{self.base_url}{path}",
+                json=payload,
+                headers=self.headers,
+                timeout=HTTP_TIMEOUT,
+            )
+            body = response.json() if response.content else None
+            return response.status_code, body
+
+        if not hasattr(self.local, "client"):
+            host = next(
+                (host for host in settings.ALLOWED_HOSTS if host[:1] not in ".*"),
+                "localhost",
+            )
+            self.local.client = Client(raise_request_exception=False, HTTP_HOST=host)
+        response = self.local.client.generic(
+            method,
+            path,
+            data=b"" if payload is None else json.dumps(payload),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        return response.status_code, response.json() if response.content else None
+
+
+@contextmanager
+def slow_clients(base_url, count, interval=1.0):
+    """Hold ``count`` connections to a server open with slowly sent requests.
+
+    Each client sends a request line and then one more header every
+    ``interval`` seconds, never finishing the request, and reconnects if the
+    server drops it. A sync server gives every such client a worker for as
+    long as it trickles; an async server parks it on the event loop.
+    """
+    url = urlsplit(base_url)
+    address = (url.hostname, url.port or 80)
+    stopped = threading.Event()
+
+    def trickle():
+        while not stopped.is_set():
+            try:
+                with socket.create_connection(address, timeout=interval * 5) as sock:
+                    sock.sendall(
+                        f"GET /api/books/ HTTP/1.1\r\nHost: {url.hostname}\r\n".encode()
+                    )
+                    while not stopped.wait(interval):
+                        sock.sendall(b"X-Slow: 1\r\n")
+            except OSError:
+                stopped.wait(interval)
+
+    threads = [threading.Thread(target=trickle, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    try:
+        # Give the clients time to connect before measuring.
+        time.sleep(interval)
+        yield
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+
+def run_scenario(calls, concurrency=1):
+    """Run zero-argument ``calls`` on ``concurrency`` threads and time each one.
+
+    A call reports failure by returning a falsy value or raising. Returns
+    the scenario summary and the values returned by the calls, in order.
+    """
+    outcomes = [None] * len(calls)
+    pending = iter(enumerate(calls))
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    index, call = next(pending, (None, None))
+                if call is None:
+                    return
+                call_started = time.perf_counter()
+                try:
+                    result = call()
+                except Exception:
+                    result = None
+                outcomes[index] = (time.perf_counter() - call_started, result)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        worker()
+    elapsed = time.perf_counter() - started
+
+    durations = [duration for duration, _ in outcomes]
+    results = [result for _, result in outcomes]
+    errors = sum(not result for result in results)
+    return summarize(durations, errors, elapsed), results
+
+
+def run_benchmark(reader, requests_per_scenario=200, concurrency=1, base_url=None):
+    """Benchmark the hot API endpoints and the overdue task.
+
+    ``reader`` is the non-staff user the borrowing requests run as. Every
+    borrowing the create scenario opens is returned again by the return
+    scenario, so inventory ends where it started. The overdue task runs
+    in this process, rolled back after each run, ``concurrency`` ignored.
+    """
+    client = BenchmarkClient(reader, base_url=base_url)
+    books_url = reverse("books:book-list")
+    borrowings_url = reverse("borrowings:borrowing-list")
+    expected_return_date = (date.today() + timedelta(days=14)).isoformat()
+    book_ids = list(
+        Book.objects.filter(inventory__gt=0)
+        .order_by("-inventory", "id")
+        .values_list("id", flat=True)[:requests_per_scenario]
+    )
+
+    def get(path):
+        return lambda: client.request("GET", path)[0] == 200
+
+    def create(book_id):
+        def call():
+            status_code, body = client.request(
+                "POST",
+                borrowings_url,
+                {"book": book_id, "expected_return_date": expected_return_date},
+            )
+            return body["id"] if status_code == 201 else None
+
+        return call
+
+    def give_back(borrowing_id):
+        return lambda: (
+            client.request(
+                "POST",
+                reverse("borrowings:borrowing-return-borrowing", args=[borrowing_id]),
+            )[0]
+            == 200
+        )
+
+    def overdue_run():
+        with transaction.atomic():
+            check_overdue_borrowings()
+            transaction.set_rollback(True)
+        return True
+
+    scenarios = {}
+    scenarios["books_list"], _ = run_scenario(
+        [get(books_url)] * requests_per_scenario, concurrency
+    )
+    scenarios["borrowings_list"], _ = run_scenario(
+        [get(borrowings_url)] * requests_per_scenario, concurrency
+    )
+    scenarios["borrowing_create"], created = run_scenario(
+        (
+            [
+                create(book_ids[number % len(book_ids)])
+                for number in range(requests_per_scenario)
+            ]
+            if book_ids
+            else []
+        ),
+        concurrency,
+    )
+    scenarios["borrowing_return"], _ = run_scenario(
+        [give_back(borrowing_id) for borrowing_id in created if borrowing_id],
+        concurrency,
+    )
+    scenarios["overdue_task"], _ = run_scenario(
+        [overdue_run] * max(requests_per_scenario // 40, 1)
+    )
+    return scenarios
+
+
+def run_connection_benchmark(queries=200):
+    """Compare opening a DB connection per request with reusing one.
+
+    ``connection_per_request`` connects before every query, as happens with
+    ``CONN_MAX_AGE=0`` (or checks one out of the pool with ``DB_POOL``);
+    ``persistent_connection`` keeps one connection and runs the health
+    check Django does at the start of each request before reusing it.
+    A separate connection is used so the default one is left alone.
+    """
+    db = connections.create_connection(DEFAULT_DB_ALIAS)
+
+    def query():
+        with db.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone() == (1,)
+
+    def new_connection():
+        db.close()
+        return query()
+
+    def reused_connection():
+        db.close_if_unusable_or_obsolete()
+        return query()
+
+    try:
+        scenarios = {}
+        scenarios["connection_per_request"], _ = run_scenario(
+            [new_connection] * queries
+        )
+        query()
+        scenarios["persistent_connection"], _ = run_scenario(
+            [reused_connection] * queries
+        )
+    finally:
+        db.close()
+    return scenarios
+
+
+def run_serializer_benchmark(runs=50, rows=500):
+    """Compare the DRF and the fast path of the book and borrowing lists.
+
+    Every call fetches a page of ``rows`` rows and renders it to JSON:
+    ``*_drf`` as model instances through the serializer and
+    ``JSONRenderer``, ``*_fast`` as ``values()`` rows through the compiled
+    serializer and ``ORJSONRenderer``. Raises ``AssertionError`` if the two
+    don't render the same bytes.
+    """
+    pages = {
+        "books": (Book.objects.defer("search_vector").order_by("id"), BookSerializer),
+        "borrowings": (
+            Borrowing.objects.select_related("book", "user").order_by("-id"),
+            BorrowingSerializer,
+        ),
+    }
+
+    scenarios = {}
+    for name, (queryset, serializer_class) in pages.items():
+        page = queryset[:rows]
+        row_serializer = compile_serializer(serializer_class())
+
+        def drf():
+            data = serializer_class(list(page), many=True).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            rows = page.values(*row_serializer.lookups)
+            return ORJSONRenderer().render(row_serializer.serialize(rows))
+
+        assert drf() == fast(), f"The {name} fast path renders different JSON."
+        scenarios[f"{name}_drf"], _ = run_scenario([drf] * runs)
+        scenarios[f"{name}_fast"], _ = run_scenario([fast] * runs)
+    return scenarios
@@ -13,3 +13,6 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+# Task duration and failure metrics.
+import library_service.metrics  # noqa: E402,F401
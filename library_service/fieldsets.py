@@ -0,0 +1,177 @@
+from django.core.exceptions import FieldDoesNotExist
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+
+from library_service.pagination import keyset_fields
+
+FIELDSET_ACTIONS = ("list", "retrieve")
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description=(
+            "Comma-separated fields to return, nested ones with a dot "
+            "(e.g. id,expected_return_date,book.title). All by default."
+        ),
+    ),
+    OpenApiParameter(
+        name="expand",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description=(
+            "Comma-separated relations to nest (e.g. book); the others are "
+            "returned as ids. All are nested when omitted."
+        ),
+    ),
+]
+
+
+def parse_fieldset(value):
+    """``"id,book.title"`` -> ``{"id": {}, "book": {"title": {}}}``.
+
+    An empty dict stands for every field of a nested serializer.
+    """
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in filter(None, (name.strip() for name in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def requested_fieldset(request):
+    """The ``fields`` and ``expand`` trees of a request, ``None`` if not given."""
+    fields = request.query_params.get("fields")
+    expand = request.query_params.get("expand")
+    return (
+        parse_fieldset(fields) if fields is not None else None,
+        parse_fieldset(expand) if expand is not None else None,
+    )
+
+
+class SparseFieldsetMixin:
+    """Serializer narrowed down by the ``?fields=`` and ``?expand=`` of a GET.
+
+    Applied by the outermost serializer of a response, to itself and to its
+    nested sparse serializers. A relation left out of ``expand`` is returned
+    as its id, read from the foreign key column without a join.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and request.method == "GET":
+            fields, expand = requested_fieldset(request)
+            if fields is not None or expand is not None:
+                self.apply_fieldset(fields, expand)
+
+    def apply_fieldset(self, fields, expand, prefix=""):
+        nested = {
+            name
+            for name, field in self.fields.items()
+            if isinstance(field, SparseFieldsetMixin)
+        }
+        errors = {}
+        if fields:
+            unknown = [name for name in fields if name not in self.fields]
+            if unknown:
+                errors["fields"] = [
+                    f"Unknown field: {prefix}{name}." for name in unknown
+                ]
+        if expand:
+            unknown = [name for name in expand if name not in nested]
+            if unknown:
+                errors["expand"] = [
+                    f"Unknown relation: {prefix}{name}." for name in unknown
+                ]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        for name in nested & set(self.fields):
+            field = self.fields[name]
+            subfields = fields.get(name) if fields else None
+            if expand is None or name in expand or subfields:
+                field.apply_fieldset(
+                    subfields,
+                    None if expand is None else expand.get(name, {}),
+                    prefix=f"{prefix}{name}.",
+                )
+            else:
+                source = {} if field.source == name else {"source": field.source}
+                self.fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True, **source
+                )
+
+
+def _collect_columns(serializer, prefix, columns, related):
+    model = serializer.Meta.model
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return False
+        if not model_field.concrete:
+            return False
+
+        path = prefix + field.source
+        columns.add(path)
+        if isinstance(field, serializers.BaseSerializer):
+            if not model_field.many_to_one and not model_field.one_to_one:
+                return False
+            related.append(path)
+            if not _collect_columns(field, f"{path}__", columns, related):
+                return False
+    return True
+
+
+def sparse_queryset(queryset, serializer, extra=()):
+    """Load only the columns ``serializer`` reads, joining only what it nests.
+
+    ``extra`` names more fields to load, e.g. the pagination ordering. The
+    queryset is returned as is when a field doesn't map to a column.
+    """
+    columns, related = set(), []
+    if not _collect_columns(serializer, "", columns, related):
+        return queryset
+    for name in extra:
+        try:
+            if queryset.model._meta.get_field(name).concrete:
+                columns.add(name)
+        except FieldDoesNotExist:
+            pass
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetViewMixin:
+    """Narrow the list and retrieve queries to the requested fieldset.
+
+    ``fieldset_extra_fields`` are loaded whatever the fieldset.
+    """
+
+    fieldset_extra_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in FIELDSET_ACTIONS or not issubclass(
+            self.get_serializer_class(), SparseFieldsetMixin
+        ):
+            return queryset
+        fields, expand = requested_fieldset(self.request)
+        if fields is None and expand is None:
+            return queryset
+        return sparse_queryset(
+            queryset,
+            self.get_serializer(),
+            [*keyset_fields(self), *self.fieldset_extra_fields],
+        )
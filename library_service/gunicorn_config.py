@@ -0,0 +1,44 @@
+"""gunicorn settings for production.
+
+Run with ``gunicorn -c python:library_service.gunicorn_config
+library_service.wsgi:application``. Every setting can be overridden through
+the ``GUNICORN_*`` environment variables below.
+"""
+
+import os
+
+from prometheus_client import multiprocess
+
+cpus = len(os.sched_getaffinity(0))
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# Requests mostly wait on Postgres, so run more workers than CPUs, each
+# with a few threads for further overlap.
+workers = int(os.getenv("GUNICORN_WORKERS", cpus * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Import Django once in the master so workers fork with it already loaded
+# and share its memory copy-on-write.
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to cap slow memory growth.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+
+def pre_fork(server, worker):
+    # Workers must open their own connections, not inherit the master's.
+    from django.db import connections
+
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
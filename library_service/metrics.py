@@ -0,0 +1,153 @@
+import glob
+import os
+import time
+
+from celery.signals import task_failure, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+BORROWING_GAUGES_KEY = "metrics:borrowing_gauges"
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling API requests.",
+    ["route", "method", "status"],
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Time spent running Celery tasks.",
+    ["task", "state"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, float("inf")),
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Celery tasks that raised an exception.",
+    ["task"],
+)
+NOTIFICATION_SEND_DURATION = Histogram(
+    "notification_send_duration_seconds",
+    "Time spent on one Telegram sendMessage call.",
+    ["outcome"],
+)
+
+
+class BorrowingGaugeCollector:
+    """Expose open and overdue borrowing counts.
+
+    The counts come from one aggregate query whose result is shared through
+    the cache for ``METRICS_GAUGE_TTL`` seconds, so scrapes of any number of
+    workers don't hit the database each time.
+    """
+
+    def describe(self):
+        yield GaugeMetricFamily("borrowings_open", "Borrowings not returned yet.")
+        yield GaugeMetricFamily(
+            "borrowings_overdue", "Open borrowings past their expected return date."
+        )
+
+    def collect(self):
+        counts = cache.get(BORROWING_GAUGES_KEY)
+        if counts is None:
+            from borrowings.models import Borrowing
+
+            counts = Borrowing.objects.filter(
+                actual_return_date__isnull=True
+            ).aggregate(
+                open=Count("id"),
+                overdue=Count(
+                    "id", filter=Q(expected_return_date__lte=timezone.now().date())
+                ),
+            )
+            cache.set(BORROWING_GAUGES_KEY, counts, settings.METRICS_GAUGE_TTL)
+
+        yield GaugeMetricFamily(
+            "borrowings_open", "Borrowings not returned yet.", value=counts["open"]
+        )
+        yield GaugeMetricFamily(
+            "borrowings_overdue",
+            "Open borrowings past their expected return date.",
+            value=counts["overdue"],
+        )
+
+
+class MultiProcessDirsCollector:
+    """Merge multiprocess metric files from several directories.
+
+    Each service (gunicorn, Celery) writes to its own
+    ``PROMETHEUS_MULTIPROC_DIR`` so process ids can't clash between
+    containers; the web process reads them all on scrape.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def collect(self):
+        files = [
+            file
+            for path in self.paths
+            for file in glob.glob(os.path.join(path, "*.db"))
+        ]
+        return MultiProcessCollector.merge(files, accumulate=True)
+
+
+REGISTRY.register(BorrowingGaugeCollector())
+
+
+def get_registry():
+    if not settings.METRICS_MULTIPROC_DIRS:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    registry.register(MultiProcessDirsCollector(settings.METRICS_MULTIPROC_DIRS))
+    registry.register(BorrowingGaugeCollector())
+    return registry
+
+
+def metrics_view(request):
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def observe_request(request, response, duration):
+    match = request.resolver_match
+    REQUEST_DURATION.labels(
+        route=match.namespace if match and match.namespace else "other",
+        method=request.method,
+        status=response.status_code,
+    ).observe(duration)
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _observe_task(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task=task.name, state=state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+@task_failure.connect
+def _count_task_failure(sender=None, **kwargs):
+    TASK_FAILURES.labels(task=sender.name).inc()
@@ -0,0 +1,150 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from library_service.metrics import observe_request
+from library_service.timing import (
+    current_metrics,
+    instrument_connection,
+    start_request_metrics,
+    stop_request_metrics,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """Report query count, DB, serializer and view time of every request.
+
+    The numbers go out as a ``Server-Timing`` header and a ``key=value`` log
+    line; statements repeated ``REQUEST_TIMING_DUPLICATE_THRESHOLD`` times
+    or more in one request are logged as a warning, as they usually mean an
+    N+1 query. With ``REQUEST_TIMING`` off the middleware removes itself
+    from the stack at startup. Keep it last in ``MIDDLEWARE`` so the view
+    time covers just the view and response rendering.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.duplicate_threshold = settings.REQUEST_TIMING_DUPLICATE_THRESHOLD
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # An async hook keeps the async handler from hopping to a thread.
+            self.process_view = self.aprocess_view
+            connection_created.connect(
+                instrument_connection, dispatch_uid="request_timing"
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics, token = start_request_metrics()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics.record_query):
+                response = self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+        return self.report(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, token = start_request_metrics()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+        return self.report(request, response, metrics, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        RequestTimingMiddleware.process_view(
+            self, request, view_func, view_args, view_kwargs
+        )
+
+    def report(self, request, response, metrics, started):
+        finished = time.perf_counter()
+
+        timings = {"db": metrics.db_time, "serializer": metrics.serializer_time}
+        if metrics.view_started is not None:
+            timings["view"] = finished - metrics.view_started
+        timings["total"] = finished - started
+        duplicates = metrics.duplicates(self.duplicate_threshold)
+
+        entries = [
+            f"{name};dur={duration * 1000:.1f}" for name, duration in timings.items()
+        ]
+        entries[0] += f';desc="{metrics.queries} queries"'
+        if duplicates:
+            entries.append(f'dup;desc="{len(duplicates)} repeated statements"')
+        response["Server-Timing"] = ", ".join(entries)
+
+        logger.info(
+            "method=%s path=%s status=%s queries=%s duplicates=%s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            metrics.queries,
+            len(duplicates),
+            " ".join(
+                f"{name}_ms={duration * 1000:.1f}" for name, duration in timings.items()
+            ),
+        )
+        for sql, count in duplicates:
+            logger.warning(
+                "Possible N+1: statement ran %s times in %s %s: %s",
+                count,
+                request.method,
+                request.path,
+                sql,
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """Record request latency per route for the ``/metrics`` endpoint.
+
+    The route is the URL namespace of the view (``books``, ``borrowings``,
+    ``users``), so the label set stays small. Keep it first in
+    ``MIDDLEWARE`` to time the whole stack; ``METRICS`` off removes it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        observe_request(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        observe_request(request, response, time.perf_counter() - started)
+        return response
@@ -0,0 +1,259 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_fields(view):
+    """Names of the fields the rows of a keyset paginated ``view`` are read by."""
+    ordering = getattr(view, "keyset_ordering", None) or getattr(
+        view.paginator, "ordering", ()
+    )
+    return [field.lstrip("-") for field in ordering]
+
+
+class KeysetPagination(BasePagination):
+    """Seek-method pagination over a unique, indexed ordering.
+
+    Instead of ``OFFSET`` the next page is selected with a ``WHERE`` clause on
+    the ordering key of the last row already seen, so every page costs the same
+    index range scan no matter how deep the client pages. The ordering must end
+    with a unique field (normally ``id``) to be a total order.
+
+    The total row count is still reported for compatibility with page number
+    pagination; clients can skip the ``COUNT(*)`` with ``?count=false``. A
+    view that already counted the rows sets ``known_count`` instead.
+    """
+
+    page_size = 10
+    ordering = ("id",)
+    cursor_query_param = "cursor"
+    cursor_query_description = "The pagination cursor value."
+    count_query_param = "count"
+    count_query_description = "Set to false to skip counting the total rows."
+    include_count = True
+    known_count = None
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.count = self.get_count(queryset) if self.should_count(request) else None
+        page, values, reverse = self.get_page_queryset(queryset, request)
+        return self.get_page(list(page), values, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async variant of :meth:`paginate_queryset` for async views."""
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.count = (
+            await self.aget_count(queryset) if self.should_count(request) else None
+        )
+        page, values, reverse = self.get_page_queryset(queryset, request)
+        return self.get_page([obj async for obj in page], values, reverse)
+
+    def get_page_queryset(self, queryset, request):
+        cursor = self.decode_cursor(request, queryset)
+        values, reverse = cursor if cursor else (None, False)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+
+        order = [self._order_by(field, reverse) for field in self.ordering]
+        return queryset.order_by(*order)[: self.page_size + 1], values, reverse
+
+    def get_page(self, results, values, reverse):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else values is not None
+        has_previous = values is not None if not reverse else has_more
+        self.next_values = (
+            self.get_values(results[-1]) if has_next and results else None
+        )
+        self.previous_values = (
+            self.get_values(results[0]) if has_previous and results else None
+        )
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "keyset_ordering", None) or self.ordering
+
+    def should_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return self.include_count
+        return value.lower() not in ("false", "0")
+
+    def get_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        return queryset.order_by().count()
+
+    async def aget_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        return await queryset.order_by().acount()
+
+    def get_keyset_filter(self, values, reverse=False):
+        """Build ``(a, b) > (x, y)`` as ``a >= x AND (a > x OR (a = x AND b > y))``.
+
+        The leading ``a >= x`` is redundant, but unlike the ``OR`` it can
+        bound the index scan, so it starts at the cursor instead of at the
+        first row.
+        """
+        keyset_filter = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            keyset_filter |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        if len(self.ordering) > 1:
+            name = self.ordering[0].lstrip("-")
+            descending = self.ordering[0].startswith("-") != reverse
+            lookup = "lte" if descending else "gte"
+            keyset_filter = Q(**{f"{name}__{lookup}": values[0]}) & keyset_filter
+        return keyset_filter
+
+    def get_values(self, obj):
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(obj, dict):
+            return [obj[name] for name in names]
+        return [getattr(obj, name) for name in names]
+
+    def get_paginated_response(self, data):
+        response = {}
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor_value(values, reverse)
+        )
+
+    def encode_cursor_value(self, values, reverse=False):
+        payload = {"v": [self._encode_value(value) for value in values]}
+        if reverse:
+            payload["r"] = 1
+        return base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode()
+        ).decode()
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = payload["v"]
+            reverse = bool(payload.get("r"))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self._to_python(queryset, field.lstrip("-"), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @staticmethod
+    def _order_by(field, reverse):
+        if not reverse:
+            return field
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _to_python(queryset, name, value):
+        """``value`` as the type of the ``name`` field or annotation."""
+        if value is None:
+            raise ValueError
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            field = annotation.output_field
+        else:
+            field = queryset.model._meta.get_field(name)
+        return field.to_python(value)
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {
+                    "type": "integer",
+                    "example": 123,
+                },
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                    "example": (
+                        "http://api.example.org/accounts/"
+                        f"?{self.cursor_query_param}=cD00ODY%3D"
+                    ),
+                },
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                    "example": (
+                        "http://api.example.org/accounts/"
+                        f"?{self.cursor_query_param}=cj0xJnA9NDg3"
+                    ),
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.count_query_description,
+                "schema": {"type": "boolean"},
+            },
+        ]
@@ -0,0 +1,199 @@
+import random
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from books.models import Book
+from books.stats import recompute_book_stats
+from borrowings.fees import calculate_fees
+from borrowings.models import Borrowing
+
+FIRST_NAMES = ["Olena", "Taras", "Iryna", "Andrii", "Maria", "Dmytro", "Sofia", "Ivan"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko"]
+TITLE_WORDS = [
+    "Django",
+    "Python",
+    "Data",
+    "Design",
+    "Patterns",
+    "History",
+    "Garden",
+    "Ocean",
+    "Night",
+    "Winter",
+    "Secret",
+    "Systems",
+    "Networks",
+    "Journey",
+    "Algorithms",
+    "Kingdom",
+    "River",
+    "Mountain",
+    "Letters",
+    "Engineering",
+]
+AUTHORS = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+
+
+def write_seeded_dates(rows):
+    """Store each ``(borrowing, borrow_date, updated_at)`` row's dates.
+
+    ``bulk_create`` replaces them with the current date and time, as the
+    fields are ``auto_now_add`` and ``auto_now``; one ``UPDATE`` writes
+    them back from a ``VALUES`` list.
+    """
+    table = connection.ops.quote_name(Borrowing._meta.db_table)
+    values = ", ".join(["(%s, %s, %s)"] * len(rows))
+    params = []
+    for borrowing, borrow_date, updated_at in rows:
+        params += [
+            borrowing.pk,
+            connection.ops.adapt_datefield_value(borrow_date),
+            connection.ops.adapt_datetimefield_value(updated_at),
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH seeded (id, borrow_date, updated_at) AS (VALUES {values}) "
+            f"UPDATE {table} SET borrow_date = seeded.borrow_date, "
+            f"updated_at = seeded.updated_at FROM seeded WHERE {table}.id = seeded.id",
+            params,
+        )
+
+
+def skewed_choice(rng, items, skew):
+    """Pick from ``items`` favouring the front of the list.
+
+    ``skew`` 1 is uniform; larger values concentrate picks on the first
+    items, like a handful of popular titles or very active readers.
+    """
+    return items[int(len(items) * rng.random() ** skew)]
+
+
+def seed_library(
+    users=100,
+    books=1000,
+    borrowings=10000,
+    active_ratio=0.15,
+    overdue_ratio=0.3,
+    late_return_ratio=0.1,
+    batch_size=5000,
+    seed=None,
+):
+    """Insert synthetic users, books and borrowings with ``bulk_create``.
+
+    Book popularity and reader activity follow a power-law-like skew,
+    borrow dates spread over the last year, loans last one to four weeks
+    and ``active_ratio`` of them are still open, ``overdue_ratio`` of those
+    past their expected return date. A book's open loans are taken from its
+    inventory; one with no copy left gets a returned loan instead. Returns
+    the created row counts.
+    """
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    today = date.today()
+    now = timezone.now()
+    password = make_password(None)
+
+    user_objects = get_user_model().objects.bulk_create(
+        (
+            get_user_model()(
+                email=f"reader{number}-{run}@seed.example",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in range(users)
+        ),
+        batch_size=batch_size,
+    )
+    book_objects = Book.objects.bulk_create(
+        (
+            Book(
+                title=" ".join(rng.sample(TITLE_WORDS, 3)) + f" {number}-{run}",
+                author=skewed_choice(rng, AUTHORS, 2),
+                cover=rng.choice(Book.CoverChoices.values),
+                inventory=rng.randint(1, 10),
+                daily_fee=Decimal(rng.randint(50, 500)) / 100,
+            )
+            for number in range(books)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = [user.id for user in user_objects]
+    book_ids = [book.id for book in book_objects]
+    daily_fees = {book.id: book.daily_fee for book in book_objects}
+    inventory = {book.id: book.inventory for book in book_objects}
+
+    def make_borrowing():
+        book_id = skewed_choice(rng, book_ids, 3)
+        loan_days = rng.randint(7, 28)
+        if rng.random() < active_ratio and inventory[book_id]:
+            inventory[book_id] -= 1
+            if rng.random() < overdue_ratio:
+                borrow_date = today - timedelta(days=loan_days + rng.randint(1, 60))
+            else:
+                borrow_date = today - timedelta(days=rng.randint(0, loan_days - 1))
+            actual_return_date = None
+        else:
+            borrow_date = today - timedelta(days=rng.randint(loan_days, 365))
+            returned_after = rng.randint(1, loan_days)
+            if rng.random() < late_return_ratio:
+                returned_after = loan_days + rng.randint(1, 21)
+            actual_return_date = min(
+                borrow_date + timedelta(days=returned_after), today
+            )
+
+        user_id = skewed_choice(rng, user_ids, 1.5)
+        expected_return_date = borrow_date + timedelta(days=loan_days)
+        fee = fine = None
+        if actual_return_date is not None:
+            fee, fine = calculate_fees(
+                borrow_date,
+                expected_return_date,
+                actual_return_date,
+                daily_fees[book_id],
+            )
+        # Last changed some time on the day it was borrowed or returned.
+        updated_at = datetime.combine(
+            actual_return_date or borrow_date, time(), tzinfo=now.tzinfo
+        ) + timedelta(seconds=rng.randint(0, 86399))
+
+        return Borrowing(
+            user_id=user_id,
+            book_id=book_id,
+            borrow_date=borrow_date,
+            expected_return_date=expected_return_date,
+            actual_return_date=actual_return_date,
+            fee=fee,
+            fine=fine,
+            updated_at=min(updated_at, now),
+        )
+
+    # Insert borrowings batch by batch so memory stays flat for large seeds.
+    for start in range(0, borrowings, batch_size):
+        batch = [make_borrowing() for _ in range(min(batch_size, borrowings - start))]
+        rows = [(b, b.borrow_date, b.updated_at) for b in batch]
+        Borrowing.objects.bulk_create(batch)
+        write_seeded_dates(rows)
+
+    # Take the open loans out of the books' inventory, grouped by how many.
+    open_loans = defaultdict(list)
+    for book in book_objects:
+        if book.inventory != inventory[book.id]:
+            open_loans[book.inventory - inventory[book.id]].append(book.id)
+    for loans, ids in open_loans.items():
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:][:batch_size]
+            Book.objects.filter(pk__in=chunk).update(inventory=F("inventory") - loans)
+
+    # bulk_create skips the signals and counters that keep book stats current.
+    recompute_book_stats()
+
+    return {"users": users, "books": books, "borrowings": borrowings}
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "django_celery_beat",
     "rest_framework_simplejwt",
@@ -56,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_service.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -63,8 +66,33 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "library_service.middleware.RequestTimingMiddleware",
 ]
 
+# Per-request query count and timings as Server-Timing headers and log lines.
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "true").lower() in ("true", "1")
+REQUEST_TIMING_DUPLICATE_THRESHOLD = 3
+
+# Async list/retrieve views for books and borrowings; asgi.py turns this on.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() in ("true", "1")
+
+# Book and borrowing lists serialized from values() rows and rendered with
+# orjson; the output is identical, this is a kill switch.
+FAST_LIST_VIEWS = os.getenv("FAST_LIST_VIEWS", "true").lower() in ("true", "1")
+
+# Prometheus metrics at /metrics. Multi-process servers (gunicorn, Celery
+# prefork) need PROMETHEUS_MULTIPROC_DIR set to an empty directory per
+# service; /metrics merges every directory in METRICS_MULTIPROC_DIRS.
+METRICS = os.getenv("METRICS", "true").lower() in ("true", "1")
+METRICS_MULTIPROC_DIRS = [
+    path
+    for path in os.getenv(
+        "METRICS_MULTIPROC_DIRS", os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+    ).split(",")
+    if path
+]
+METRICS_GAUGE_TTL = 60
+
 ROOT_URLCONF = "library_service.urls"
 
 TEMPLATES = [
@@ -85,24 +113,83 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "library_service.wsgi.application"
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": os.environ["POSTGRES_DB"],
-        "USER": os.environ["POSTGRES_USER"],
-        "PASSWORD": os.environ["POSTGRES_PASSWORD"],
-        "HOST": os.environ["POSTGRES_HOST"],
-        "PORT": os.environ["POSTGRES_PORT"],
+TEST_RUNNER = "library_service.testing.TestRunner"
+
+# SQLITE_PATH runs on SQLite instead, e.g. for quick local test runs. Book
+# search then ranks in Python; row locking and the catalog import's upsert
+# need PostgreSQL.
+if os.getenv("SQLITE_PATH"):
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ["SQLITE_PATH"],
+        }
     }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ["POSTGRES_DB"],
+            "USER": os.environ["POSTGRES_USER"],
+            "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+            "HOST": os.environ["POSTGRES_HOST"],
+            "PORT": os.environ["POSTGRES_PORT"],
+            # Reuse a connection across requests for DB_CONN_MAX_AGE seconds,
+            # checking it is still alive before the first query of a request.
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+
+    # psycopg 3 connection pool per process instead of persistent
+    # connections; needs psycopg[binary,pool] installed in place of psycopg2.
+    if os.getenv("DB_POOL", "false").lower() in ("true", "1"):
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            }
+        }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # JWT revocations must never be evicted, or revoked tokens work again.
+    # Entries expire with the access token lifetime, so they stay few.
+    "revocations": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "revocations",
+        "OPTIONS": {"MAX_ENTRIES": sys.maxsize},
+    },
 }
 
+if os.getenv("CACHE_REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CACHE_REDIS_URL"],
+    }
+
+# Point at a Redis running with maxmemory-policy noeviction.
+if os.getenv("REVOCATION_REDIS_URL"):
+    CACHES["revocations"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REVOCATION_REDIS_URL"],
+    }
+
+CATALOG_CACHE_TIMEOUT = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
 AUTH_PASSWORD_VALIDATORS = [
     {
-        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+        "NAME": (
+            "django.contrib.auth.password_validation."
+            "UserAttributeSimilarityValidator"
+        ),
     },
     {
         "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
@@ -141,24 +228,43 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "library_service.throttling.AnonRateThrottle",
+        "library_service.throttling.UserRateThrottle",
+        "library_service.throttling.ScopedRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "10/day", "user": "50/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.getenv("THROTTLE_ANON_RATE", "10/day"),
+        "user": os.getenv("THROTTLE_USER_RATE", "50/day"),
+        "borrow": os.getenv("THROTTLE_BORROW_RATE", "10/hour"),
+        "search": os.getenv("THROTTLE_SEARCH_RATE", "30/min"),
+    },
 }
 
+# Throttle buckets shared by every worker; without it they are kept in the
+# default cache, per process when that is locmem.
+THROTTLE_REDIS_URL = os.getenv("THROTTLE_REDIS_URL")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION1",
+    "TOKEN_OBTAIN_SERIALIZER": (
+        "user.authentication.ClaimsTokenObtainPairSerializer"
+    ),
+    "TOKEN_REFRESH_SERIALIZER": (
+        "user.authentication.ClaimsTokenRefreshSerializer"
+    ),
 }
 
+# Seconds each process trusts its last look at a user's token revocation.
+JWT_REVOCATION_CACHE_TTL = int(os.getenv("JWT_REVOCATION_CACHE_TTL", "10"))
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library Service API",
     "DESCRIPTION": "Borrowing books from library",
@@ -176,6 +282,50 @@ AUTH_USER_MODEL = "user.User"
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_REQUEST_TIMEOUT = 10
+TELEGRAM_POOL_SIZE = 10
+
+# Outbox delivery: messages are batched per chat, at most one send per
+# NOTIFICATION_SEND_INTERVAL seconds, failures retried with exponential backoff.
+# A claimed batch is sent again if it isn't settled within
+# NOTIFICATION_CLAIM_TIMEOUT seconds, e.g. when its worker died.
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_CLAIM_TIMEOUT = 600
+NOTIFICATION_SEND_INTERVAL = 1.0
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BACKOFF = 30
+NOTIFICATION_RETRY_BACKOFF_MAX = 3600
+
+# Overdue scan: rows fetched per server-side cursor round trip, digests
+# written per outbox insert and borrowing id span handled by one subtask.
+OVERDUE_CHUNK_SIZE = 2000
+OVERDUE_DIGESTS_PER_FLUSH = 100
+OVERDUE_RANGE_SIZE = 50000
+
+# Staff exports: rows read per server-side cursor round trip and encoded
+# (and gzipped) per chunk of the streamed response.
+EXPORT_BATCH_SIZE = 2000
+
+# Catalog imports: books upserted per query and invalid rows reported back.
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MAX_ERRORS = 1000
+
+# Seconds a returned copy is held for the next reservation in line.
+RESERVATION_CLAIM_WINDOW = int(os.getenv("RESERVATION_CLAIM_WINDOW", 24 * 3600))
+
+# Domain events relayed from the outbox per batch; failing consumers are
+# retried with the notification backoff, at most EVENT_MAX_ATTEMPTS times.
+EVENT_RELAY_BATCH_SIZE = 1000
+EVENT_MAX_ATTEMPTS = 10
+
+# Borrowing delta sync (?since=): changes from the last DELTA_SYNC_OVERLAP
+# seconds are sent again on the next poll, to cover transactions that commit
+# late and clock skew between app servers.
+DELTA_SYNC_OVERLAP = int(os.getenv("DELTA_SYNC_OVERLAP", 10))
+
+# Borrowing fees: each overdue day is fined daily_fee times this multiplier.
+BORROWING_FINE_MULTIPLIER = os.getenv("BORROWING_FINE_MULTIPLIER", "2")
 
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
@@ -185,3 +335,17 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Sweeps picking up work whose task was never queued, e.g. while the broker
+# was down. They are safe to run at any time; the database scheduler adds
+# them on startup, next to the tasks scheduled in the admin.
+CELERY_BEAT_SCHEDULE = {
+    "deliver-notifications": {
+        "task": "borrowings.tasks.deliver_notifications",
+        "schedule": 60,
+    },
+    "relay-events": {"task": "borrowings.tasks.relay_events", "schedule": 60},
+    "expire-reservations": {
+        "task": "borrowings.tasks.expire_reservations",
+        "schedule": 300,
+    },
+}
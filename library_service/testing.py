@@ -0,0 +1,83 @@
+import unittest
+from contextlib import ContextDecorator
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import runner
+from django.test.utils import CaptureQueriesContext
+
+
+class query_budget(ContextDecorator):
+    """Fail when the wrapped block runs more than ``max_queries`` queries.
+
+    Works both as a context manager and as a decorator::
+
+        with query_budget(2):
+            self.client.get(url)
+
+        @query_budget(2)
+        def test_list(self): ...
+
+    Unlike ``assertNumQueries`` the budget is an upper bound, so it only
+    trips on regressions such as a missing ``select_related``.
+    """
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        return self.context.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+
+        executed = len(self.context)
+        if executed > self.max_queries:
+            queries = "\n".join(
+                f"{number}. {query['sql']}"
+                for number, query in enumerate(self.context.captured_queries, 1)
+            )
+            raise AssertionError(
+                f"{executed} queries executed, budget is {self.max_queries}:\n"
+                f"{queries}"
+            )
+        return False
+
+
+class ClearCacheMixin:
+    """Test result clearing the default cache before every test.
+
+    The cache holds the throttles' token buckets, keyed by user id. Ids are
+    reused once a test's transaction rolls back on SQLite, so without this a
+    test could be throttled by requests made in earlier ones.
+    """
+
+    def startTest(self, test):
+        cache.clear()
+        super().startTest(test)
+
+
+class RemoteTestResult(ClearCacheMixin, runner.RemoteTestResult):
+    pass
+
+
+class RemoteTestRunner(runner.RemoteTestRunner):
+    resultclass = RemoteTestResult
+
+
+class ParallelTestSuite(runner.ParallelTestSuite):
+    runner_class = RemoteTestRunner
+
+
+class TestRunner(runner.DiscoverRunner):
+    """Test runner starting every test, in any order, with an empty cache."""
+
+    parallel_test_suite = ParallelTestSuite
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type(resultclass.__name__, (ClearCacheMixin, resultclass), {})
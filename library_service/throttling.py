@@ -0,0 +1,141 @@
+import logging
+import math
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import throttling
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] bucket; ARGV capacity, tokens added per second. Returns whether the
+# request may go ahead and, if not, seconds until a token is available.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+
+local allowed, wait = 0, (1 - tokens) / refill_rate
+if tokens >= 1 then
+    allowed, wait, tokens = 1, 0, tokens - 1
+end
+
+redis.call(
+    "HSET", KEYS[1], "tokens", tostring(tokens),
+    "updated_at", string.format("%.6f", now)
+)
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / refill_rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+def take_token(tokens, updated_at, now, capacity, refill_rate):
+    """Python version of ``TOKEN_BUCKET_SCRIPT`` for the cache backed buckets.
+
+    Returns whether a token was taken, the seconds to wait otherwise and the
+    tokens left.
+    """
+    tokens = min(capacity, tokens + max(0, now - updated_at) * refill_rate)
+    if tokens >= 1:
+        return True, 0, tokens - 1
+    return False, (1 - tokens) / refill_rate, tokens
+
+
+class RedisTokenBuckets:
+    """Token buckets kept in Redis and updated atomically by a Lua script.
+
+    Each bucket is a two field hash expiring once it would be full again,
+    so memory per client stays constant and every worker and node shares
+    the same limits.
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, capacity, refill_rate):
+        allowed, wait = self.script(keys=[key], args=[capacity, refill_rate])
+        return bool(allowed), float(wait)
+
+
+class CacheTokenBuckets:
+    """Token buckets in Django's cache, for development and tests.
+
+    Updates are only atomic within a process, so limits are per process
+    unless the cache is shared, just like DRF's default throttles.
+    """
+
+    lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        with self.lock:
+            tokens, updated_at = cache.get(key, (capacity, now))
+            allowed, wait, tokens = take_token(
+                tokens, updated_at, now, capacity, refill_rate
+            )
+            cache.set(key, (tokens, now), math.ceil(capacity / refill_rate))
+        return allowed, wait
+
+
+_buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        _buckets = (
+            RedisTokenBuckets(settings.THROTTLE_REDIS_URL)
+            if settings.THROTTLE_REDIS_URL
+            else CacheTokenBuckets()
+        )
+    return _buckets
+
+
+class TokenBucketRateThrottle(throttling.SimpleRateThrottle):
+    """Rate throttle using a token bucket instead of a request history.
+
+    A rate of ``N/period`` allows bursts of up to N requests and refills
+    N tokens per period. If Redis can't be reached, requests are let
+    through rather than failed.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self.wait_time = get_buckets().consume(
+                self.key, self.num_requests, self.num_requests / self.duration
+            )
+        except redis.RedisError as e:
+            logger.warning("Throttle check for %s skipped: %s", self.key, e)
+            return True
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, TokenBucketRateThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, TokenBucketRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, TokenBucketRateThrottle):
+    """Extra limit for views with a ``throttle_scope``, e.g. borrowing."""
@@ -0,0 +1,110 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Time and query counters collected while one request is handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.view_started = None
+        self.statements = Counter()
+        self._serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook counting and timing queries."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """Statements run at least ``threshold`` times, most repeated first.
+
+        Parameters are not part of the statement, so the same query issued
+        for every row of a list (an N+1) counts as one repeated statement.
+        """
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def current_metrics():
+    return _current_metrics.get()
+
+
+def record_current_query(execute, sql, params, many, context):
+    """Execute wrapper feeding the metrics of the request being handled."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """``connection_created`` receiver installing :func:`record_current_query`.
+
+    Async views run queries on a worker thread with its own connection, out
+    of reach of an ``execute_wrapper`` block on the event loop, so each new
+    connection gets the wrapper instead.
+    """
+    if record_current_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_current_query)
+
+
+def start_request_metrics():
+    metrics = RequestMetrics()
+    return metrics, _current_metrics.set(metrics)
+
+
+def stop_request_metrics(token):
+    _current_metrics.reset(token)
+
+
+@contextmanager
+def timed_serialization():
+    """Count the block as serializer time, like :class:`TimedSerializerMixin`."""
+    metrics = _current_metrics.get()
+    if metrics is None or metrics._serializing:
+        yield
+        return
+
+    metrics._serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics._serializing = False
+
+
+class TimedSerializerMixin:
+    """Add the time spent in ``to_representation`` to the request metrics.
+
+    Only the outermost call is timed, so nested serializers and list items
+    aren't counted twice. Costs a context variable lookup when timing is off.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current_metrics.get()
+        if metrics is None or metrics._serializing:
+            return super().to_representation(instance)
+
+        metrics._serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics._serializing = False
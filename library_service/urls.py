@@ -6,6 +6,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library_service.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/books/", include("books.urls")),
@@ -21,5 +23,6 @@ urlpatterns = [
         "api/doc/redoc/",
         SpectacularRedocView.as_view(url_name="schema"),
         name="redoc",
-    )
+    ),
+    path("metrics", metrics_view, name="metrics"),
 ]
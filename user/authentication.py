@@ -0,0 +1,107 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+REVOKED_KEY = "auth:revoked:{}"
+REVOCATION_CACHE = "revocations"
+LOCAL_REVOCATIONS_MAX_SIZE = 10000
+
+# user id -> (checked at, revoked at or None), shared by the process' threads
+_local_revocations = {}
+
+
+def add_user_claims(token, user):
+    """Sign what the API needs to know about the user into ``token``."""
+    token["email"] = user.email
+    token["is_staff"] = user.is_staff
+    return token
+
+
+def revoke_tokens(user_id):
+    """Reject the user's access tokens issued until now.
+
+    The revocation is kept in the ``revocations`` cache for the access
+    token lifetime; other processes see it within
+    ``JWT_REVOCATION_CACHE_TTL`` seconds. It is stored as a whole second,
+    like the ``iat`` claim, and only tokens issued in earlier seconds are
+    rejected. Refresh tokens keep working as long as the user is active, and
+    mint access tokens with the user's current claims.
+    """
+    caches[REVOCATION_CACHE].set(
+        REVOKED_KEY.format(user_id),
+        int(time.time()),
+        settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds(),
+    )
+    _local_revocations.pop(user_id, None)
+
+
+def get_revoked_at(user_id):
+    """Time the user's tokens were last revoked, cached for a few seconds."""
+    now = time.monotonic()
+    entry = _local_revocations.get(user_id)
+    if entry is None or now - entry[0] > settings.JWT_REVOCATION_CACHE_TTL:
+        if len(_local_revocations) >= LOCAL_REVOCATIONS_MAX_SIZE:
+            _local_revocations.clear()
+        entry = (now, caches[REVOCATION_CACHE].get(REVOKED_KEY.format(user_id)))
+        _local_revocations[user_id] = entry
+    return entry[1]
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that trusts the user claims signed into the token.
+
+    Instead of loading the user row on every request, it returns a
+    ``TokenUser`` with the ``id``, ``email`` and ``is_staff`` claims, and
+    only checks the token wasn't revoked since it was issued. Tokens issued
+    without these claims fall back to the database lookup. Views that need
+    the full user, like updating the profile, should use
+    ``JWTAuthentication`` instead.
+    """
+
+    def get_user(self, validated_token):
+        if "email" not in validated_token:
+            return super().get_user(validated_token)
+
+        revoked_at = get_revoked_at(validated_token[api_settings.USER_ID_CLAIM])
+        if revoked_at is not None and validated_token["iat"] < revoked_at:
+            raise AuthenticationFailed(
+                _("Token has been revoked."), code="token_revoked"
+            )
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh access tokens with the user's current claims."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        user = (
+            get_user_model()
+            .objects.filter(
+                **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+            )
+            .first()
+        )
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+
+        return {"access": str(add_user_claims(refresh.access_token, user))}
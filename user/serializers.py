@@ -2,8 +2,13 @@ from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 
+from library_service.fieldsets import SparseFieldsetMixin
+from library_service.timing import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(
+    SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = get_user_model()
         fields = ("id", "email", "password", "first_name", "last_name", "is_staff")
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from user.authentication import revoke_tokens
+
+TOKEN_FIELDS = ("is_active", "is_staff", "email", "password")
+
+
+@receiver(pre_save, sender=get_user_model())
+def check_token_fields(sender, instance, update_fields=None, **kwargs):
+    """Note whether a change makes the user's signed token claims stale."""
+    instance._revoke_tokens = False
+    if instance.pk is None or (
+        update_fields is not None and not set(update_fields) & set(TOKEN_FIELDS)
+    ):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*TOKEN_FIELDS).first()
+    instance._revoke_tokens = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in TOKEN_FIELDS
+    )
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_stale_tokens(sender, instance, **kwargs):
+    if getattr(instance, "_revoke_tokens", False):
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
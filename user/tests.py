@@ -0,0 +1,202 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from unittest.mock import patch
+import time
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library_service.testing import query_budget
+from user import authentication
+from user.serializers import UserSerializer
+
+CREATE_USER_URL = reverse("users:register")
+ME_URL = reverse("users:manage_user")
+TOKEN_URL = reverse("users:token_obtain_pair")
+TOKEN_REFRESH_URL = reverse("users:token_refresh")
+BORROWING_URL = reverse("borrowings:borrowing-list")
+
+
+class UnauthenticatedUserApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_create_user(self):
+        payload = {
+            "email": "new@test.com",
+            "password": "testpass",
+            "first_name": "New",
+            "last_name": "User",
+        }
+
+        response = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = get_user_model().objects.get(email=payload["email"])
+        self.assertTrue(user.check_password(payload["password"]))
+        self.assertNotIn("password", response.data)
+
+    def test_auth_required_for_me(self):
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedUserApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_me(self):
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, UserSerializer(self.user).data)
+
+    def test_retrieve_me_query_budget(self):
+        access = self.client.post(
+            TOKEN_URL, {"email": "user@test.com", "password": "testpass"}
+        ).data["access"]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION1=f"Bearer {access}")
+
+        # The user row, loaded by the authentication and serialized as is.
+        with query_budget(1):
+            response = client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["email"], "user@test.com")
+
+    def test_retrieve_me_fields(self):
+        response = self.client.get(ME_URL, {"fields": "id,email"})
+
+        self.assertEqual(response.data, {"id": self.user.id, "email": "user@test.com"})
+
+
+class StatelessJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        caches[authentication.REVOCATION_CACHE].clear()
+        authentication._local_revocations.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        response = self.client.post(
+            TOKEN_URL, {"email": "user@test.com", "password": "testpass"}
+        )
+        # Issued a second before the revocations the tests trigger.
+        access = AccessToken(response.data["access"])
+        access["iat"] -= 1
+        self.access = str(access)
+        self.refresh = response.data["refresh"]
+
+    def authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION1=f"Bearer {token}")
+
+    def test_token_carries_user_claims(self):
+        token = AccessToken(self.access)
+
+        self.assertEqual(token["email"], "user@test.com")
+        self.assertFalse(token["is_staff"])
+
+    def test_requests_skip_user_lookup(self):
+        self.authorize(self.access)
+
+        with query_budget(2):
+            response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_without_claims_loads_user(self):
+        self.authorize(AccessToken.for_user(self.user))
+
+        response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivation_revokes_tokens(self):
+        self.authorize(self.access)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(BORROWING_URL)
+        refresh_response = self.client.post(
+            TOKEN_REFRESH_URL, {"refresh": self.refresh}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(refresh_response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrelated_change_keeps_tokens(self):
+        self.authorize(self.access)
+        self.user.first_name = "Renamed"
+        self.user.save()
+
+        response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_picks_up_staff_change(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.post(TOKEN_REFRESH_URL, {"refresh": self.refresh})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(AccessToken(response.data["access"])["is_staff"])
+
+    def test_revocation_seen_after_local_cache_expires(self):
+        self.authorize(self.access)
+        self.client.get(BORROWING_URL)
+        # As if another process revoked the tokens.
+        caches[authentication.REVOCATION_CACHE].set(
+            authentication.REVOKED_KEY.format(self.user.id), 2**62
+        )
+
+        response = self.client.get(BORROWING_URL)
+        with self.settings(JWT_REVOCATION_CACHE_TTL=-1):
+            expired_response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(expired_response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_issued_in_the_revocation_second_stay_valid(self):
+        second = int(time.time()) - 10
+        with patch("time.time", return_value=second + 0.9):
+            authentication.revoke_tokens(self.user.id)
+        token = AccessToken(self.access)
+        token["iat"] = second
+        self.authorize(token)
+
+        response = self.client.get(BORROWING_URL)
+        token["iat"] -= 1
+        self.authorize(token)
+        revoked_response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(revoked_response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocations_are_not_evicted_with_cached_responses(self):
+        self.user.is_staff = True
+        self.user.save()
+        for number in range(1000):
+            cache.set(f"books:catalog:response:{number}", number)
+        authentication._local_revocations.clear()
+        self.authorize(self.access)
+
+        response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_me_uses_user_row(self):
+        self.authorize(self.access)
+
+        response = self.client.patch(ME_URL, {"first_name": "Changed"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Changed")
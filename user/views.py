@@ -2,6 +2,10 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from drf_spectacular.utils import extend_schema, extend_schema_view
+
+from library_service.fieldsets import FIELDSET_PARAMETERS
 
 from user.models import User
 from user.serializers import UserSerializer, AuthTokenSerializer
@@ -19,9 +23,12 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
 
 
+@extend_schema_view(get=extend_schema(parameters=FIELDSET_PARAMETERS))
 class ManageUserView(generics.RetrieveUpdateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    # Needs the user row, not just the token claims.
+    authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):